@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from util import load_data
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+
+def hash_question(question):
+    return hashlib.sha256(normalize_question(question).encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Caches the answers of a RAG app by question.
+
+    A question matches a cached one if its normalized text is identical, or else
+    if the cosine similarity of their embeddings reaches similarity_threshold.
+    Entries belong to an index version and are dropped once the index changes,
+    when they are older than ttl seconds, or when the cache grows past
+    max_entries (least recently used first).
+
+    The cache lives inside the vector store directory, so deleting the store
+    also resets it. The embeddings of the questions are stored next to it as a
+    float32 matrix in answer_cache.npy, one row per entry.
+    """
+
+    FILE_NAME = "answer_cache.json"
+    EMBEDDINGS_FILE_NAME = "answer_cache.npy"
+
+    def __init__(self, vector_store_path, index_version, config):
+        self.path = os.path.join(vector_store_path, self.FILE_NAME)
+        self.embeddings_path = os.path.join(
+            vector_store_path, self.EMBEDDINGS_FILE_NAME
+        )
+        self.index_version = index_version
+        self.similarity_threshold = config.get(
+            "similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD
+        )
+        self.ttl = config.get("ttl", DEFAULT_TTL)
+        self.max_entries = config.get("max_entries", DEFAULT_MAX_ENTRIES)
+        self.lock = threading.Lock()
+
+        self.entries = []
+        self.embeddings = []
+        entries, embeddings = self.load()
+        for entry, embedding in zip(entries, embeddings):
+            if entry["index_version"] == index_version:
+                self.entries.append(entry)
+                self.embeddings.append(embedding)
+        with self.lock:
+            self.evict()
+
+    def load(self):
+        """
+        Returns the stored entries and their embeddings. Files that do not
+        match, for example after an interrupted save, are ignored.
+        """
+        data = load_data(self.path) or {}
+        entries = data.get("entries", [])
+        if not entries or not os.path.exists(self.embeddings_path):
+            return [], []
+        try:
+            embeddings = np.load(self.embeddings_path)
+        except (OSError, ValueError):
+            return [], []
+        if len(embeddings) != len(entries):
+            return [], []
+        return entries, list(embeddings)
+
+    def save(self):
+        """
+        Writes the entries and the embedding matrix, each replaced atomically.
+        The cache can be rebuilt, so the files are not synced to the disk.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.embeddings_path}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, np.stack(self.embeddings) if self.embeddings else [])
+        os.replace(temp_path, self.embeddings_path)
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"entries": self.entries}, file)
+        os.replace(temp_path, self.path)
+
+    def lookup_exact(self, question):
+        """
+        Returns the cached answer to an identical question, if any. Expired
+        entries are dropped before every lookup.
+        """
+        question_hash = hash_question(question)
+        with self.lock:
+            self.evict()
+            for index, entry in enumerate(self.entries):
+                if entry["hash"] == question_hash:
+                    return self.hit(index)
+
+    def lookup_similar(self, embedding):
+        """
+        Returns the cached answer to the most similar question above the
+        threshold, if any.
+        """
+        with self.lock:
+            self.evict()
+            if not self.entries:
+                return None
+            query = np.array(embedding)
+            matrix = np.stack(self.embeddings)
+            similarities = (
+                matrix
+                @ query
+                / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+            )
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                return self.hit(best)
+
+    def hit(self, index):
+        entry = self.entries[index]
+        entry["last_used"] = time.time()
+        return entry["answer"]
+
+    def store(self, question, embedding, answer):
+        """
+        Adds an answer to the cache and saves it. Empty answers, for example of
+        a cancelled response, are not cached.
+        """
+        if not answer.strip():
+            return
+        now = time.time()
+        with self.lock:
+            self.entries.append(
+                {
+                    "hash": hash_question(question),
+                    "question": question,
+                    "answer": answer,
+                    "index_version": self.index_version,
+                    "created": now,
+                    "last_used": now,
+                }
+            )
+            self.embeddings.append(np.asarray(embedding, dtype=np.float32))
+            self.evict()
+            self.save()
+
+    def evict(self):
+        """
+        Drops expired entries and the least recently used ones over the size
+        limit.
+        """
+        now = time.time()
+        keep = [
+            index
+            for index, entry in enumerate(self.entries)
+            if now - entry["created"] <= self.ttl
+        ]
+        keep.sort(key=lambda index: self.entries[index]["last_used"])
+        keep = sorted(keep[max(0, len(keep) - self.max_entries) :])
+        self.entries = [self.entries[index] for index in keep]
+        self.embeddings = [self.embeddings[index] for index in keep]
@@ -0,0 +1,213 @@
+from contextlib import aclosing
+from copy import deepcopy
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from chat_app_manager import ChatAppManager
+from generation_scheduler import GenerationScheduler
+from knowledge_interface import KnowledgeInterface
+
+
+def read_questions(lines):
+    """
+    Yields (line number, id, question) tuples. Lines are JSON objects with a
+    "question" and an optional "id", or else plain text questions. The question
+    is None for JSON objects without one.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            data = line
+        if isinstance(data, dict):
+            question = data.get("question")
+            if not isinstance(question, str):
+                question = None
+            yield number, str(data.get("id", number)), question
+        else:
+            yield number, str(number), str(data)
+
+
+def create_session(chat_app, session_id, question):
+    """
+    Returns a throwaway session with the app's initial messages and the
+    question. Batch sessions are never stored.
+    """
+    messages = deepcopy(chat_app["initial_messages"])
+    messages.append({"role": "user", "content": question})
+    for index, message in enumerate(messages):
+        message["id"] = f"{session_id}-{index}"
+        message["timestamp"] = ""
+    return {"id": session_id, "app": chat_app["id"], "messages": messages}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class BatchRunner:
+    """
+    Answers questions with a chat or RAG app without the TUI and writes one
+    JSON line per answer, in the order the answers complete.
+
+    Every result records the time spent queued for a generation slot, the time
+    to the first token and the total time, all in seconds.
+    """
+
+    def __init__(self, app_id, concurrency, output):
+        chat_app_manager = ChatAppManager()
+        self.chat_app = chat_app_manager.get_chat_app_by_id(app_id)
+        if self.chat_app is None:
+            sys.exit(f"No app with id {app_id!r} in apps.json")
+        self.knowledge_interface = KnowledgeInterface(chat_app_manager)
+        self.knowledge_interface.scheduler = GenerationScheduler(
+            concurrency, concurrency
+        )
+        self.knowledge_interface.scheduler.state_callback = self.record_state
+        self.output = output
+        self.started = {}
+        self.results = []
+
+    def record_state(self, session_id, state):
+        if state == "running":
+            self.started[session_id] = time.perf_counter()
+
+    def warm_up(self):
+        """
+        Builds the RAG engine up front, so ingestion is not counted as latency
+        of the first questions.
+        """
+        if self.chat_app["chat_app_type"]["name"] != "rag":
+            return 0.0
+        start = time.perf_counter()
+        self.knowledge_interface.setup_rag(self.chat_app)
+        return time.perf_counter() - start
+
+    def write_result(self, result):
+        self.results.append(result)
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def answer(self, number, query_id, question):
+        if question is None:
+            self.write_result(
+                {"id": query_id, "error": f"Line {number} has no question"}
+            )
+            return
+        # ids may repeat, and the scheduler and context window are keyed by
+        # the session id
+        session = create_session(self.chat_app, f"batch-{query_id}-{number}", question)
+        response_info = {}
+        result = {"id": query_id, "question": question}
+        parts = []
+        first_token = None
+        start = time.perf_counter()
+        try:
+            async with aclosing(
+                self.knowledge_interface.generate_response_stream(
+                    session, response_info
+                )
+            ) as stream:
+                async for text in stream:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(text)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        end = time.perf_counter()
+        started = self.started.pop(session["id"], start)
+        trace = response_info.get("trace")
+        if trace and "error" not in result:
+            self.knowledge_interface.tracer.record(trace)
+
+        result["answer"] = "".join(parts)
+        result["cached"] = response_info.get("cached", False)
+        result["queued_s"] = round(started - start, 4)
+        result["first_token_s"] = (
+            round(first_token - start, 4) if first_token is not None else None
+        )
+        result["total_s"] = round(end - start, 4)
+        if trace:
+            result["spans"] = {
+                span["name"]: span["duration_ms"] for span in trace.spans
+            }
+        self.write_result(result)
+
+    async def run(self, questions):
+        tasks = [
+            asyncio.create_task(self.answer(number, query_id, question))
+            for number, query_id, question in questions
+        ]
+        await asyncio.gather(*tasks)
+
+    def summary(self, elapsed):
+        totals = [result["total_s"] for result in self.results if "total_s" in result]
+        first_tokens = [
+            result["first_token_s"]
+            for result in self.results
+            if result.get("first_token_s") is not None
+        ]
+        errors = sum(1 for result in self.results if "error" in result)
+        return (
+            f"{len(self.results)} questions ({errors} failed) in {elapsed:.2f}s, "
+            f"{len(self.results) / elapsed if elapsed else 0:.2f} questions/s\n"
+            f"total p50 {percentile(totals, 0.5):.3f}s "
+            f"p95 {percentile(totals, 0.95):.3f}s, "
+            f"first token p50 {percentile(first_tokens, 0.5):.3f}s "
+            f"p95 {percentile(first_tokens, 0.95):.3f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answers questions with an app from apps.json without the TUI."
+    )
+    parser.add_argument("app_id")
+    parser.add_argument(
+        "-i",
+        "--input",
+        default="-",
+        help="JSONL or text file with one question per line (default: stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="JSONL file for the answers (default: stdout)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=1,
+        help="answers generated at once (default: 1)",
+    )
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    with input_file:
+        questions = list(read_questions(input_file))
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    runner = BatchRunner(args.app_id, args.concurrency, output)
+    warm_up = runner.warm_up()
+    if warm_up:
+        print(f"Engine ready after {warm_up:.2f}s", file=sys.stderr)
+    start = time.perf_counter()
+    asyncio.run(runner.run(questions))
+    print(runner.summary(time.perf_counter() - start), file=sys.stderr)
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import random
+
+from util import generate_session_preview, save_data
+
+WORDS = (
+    "index vector query latency model token stream session chunk document "
+    "embedding cache server retrieval answer context prompt window batch "
+    "throughput request response history sidebar render markdown table"
+).split()
+
+
+def generate_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_session(rng, session_id, app_id, message_count, words_per_message):
+    """
+    Returns a session with alternating user and assistant messages. Assistant
+    messages contain some Markdown, like real answers.
+    """
+    messages = []
+    for index in range(message_count):
+        role = "user" if index % 2 == 0 else "assistant"
+        content = generate_text(rng, words_per_message)
+        if role == "assistant":
+            content = (
+                f"## {generate_text(rng, 3)}\n\n{content}\n\n"
+                f"- {generate_text(rng, 5)}\n- {generate_text(rng, 5)}\n\n"
+                f"```python\nprint({index})\n```"
+            )
+        messages.append(
+            {
+                "role": role,
+                "content": content,
+                "timestamp": "2024-01-01 00:00:00",
+                "id": f"{session_id}-{index}",
+            }
+        )
+    return {
+        "id": session_id,
+        "app": app_id,
+        "scroll_pos": 0,
+        "preview": generate_session_preview(messages),
+        "messages": messages,
+    }
+
+
+def write_sessions(
+    save_dir, app_id, session_count, message_count, words_per_message=40, seed=0
+):
+    """
+    Writes a session.json with the given number of sessions to save_dir and
+    returns the session ids. The last session is the current one.
+    """
+    rng = random.Random(seed)
+    sessions = [
+        generate_session(
+            rng, f"session-{index}", app_id, message_count, words_per_message
+        )
+        for index in range(session_count)
+    ]
+    save_data(
+        {
+            "last_session": sessions[-1]["id"] if sessions else None,
+            "sidebar_scrollpos": 0,
+            "sessions": sessions,
+        },
+        os.path.join(save_dir, "session.json"),
+    )
+    return [session["id"] for session in sessions]
+
+
+def write_documents(input_dir, document_count, paragraphs=20, seed=0):
+    """
+    Writes Markdown documents with headings and paragraphs to input_dir.
+    """
+    rng = random.Random(seed)
+    os.makedirs(input_dir, exist_ok=True)
+    for index in range(document_count):
+        sections = [f"# Document {index}"]
+        for paragraph in range(paragraphs):
+            if paragraph % 5 == 0:
+                sections.append(f"## {generate_text(rng, 4)}")
+            sections.append(generate_text(rng, rng.randint(40, 120)) + ".")
+        with open(os.path.join(input_dir, f"document-{index}.md"), "w") as file:
+            file.write("\n\n".join(sections) + "\n")
@@ -0,0 +1,478 @@
+from contextlib import aclosing
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from corpus import write_documents, write_sessions  # noqa: E402
+from stub_ollama import StubOllama  # noqa: E402
+from util import save_data  # noqa: E402
+
+APP_PATH_VARIABLE = "OLLAMA-RAG-TUI_PATH"
+CHAT_APP_ID = "bench-chat"
+RAG_APP_ID = "bench-rag"
+BENCHMARKS = ["startup", "streaming", "switch", "ingestion", "save"]
+
+SIZES = {
+    "quick": {
+        "streaming_turns": 3,
+        "switch_sessions": 6,
+        "switch_messages": 100,
+        "documents": 30,
+        "history_sizes": [1000, 10000],
+    },
+    "full": {
+        "streaming_turns": 10,
+        "switch_sessions": 12,
+        "switch_messages": 400,
+        "documents": 200,
+        "history_sizes": [1000, 10000, 100000],
+    },
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def metric(value, unit, better="lower"):
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+def prepare_save_dir(root, name, stub, settings=None):
+    """
+    Creates an app save directory with settings pointing at the stub server and
+    the benchmark apps, and makes it the one the app modules use.
+    """
+    save_dir = os.path.join(root, name)
+    os.makedirs(save_dir)
+    save_data(
+        {
+            "ollama": {"host": stub.host},
+            "embedding_cache": {"enabled": False},
+            **(settings or {}),
+        },
+        os.path.join(save_dir, "settings.json"),
+    )
+    save_data(
+        {
+            "apps": [
+                {
+                    "id": CHAT_APP_ID,
+                    "prompt": "",
+                    "model": "bench-model",
+                    "chat_app_type": {"name": "chat"},
+                    "initial_messages": [],
+                },
+                {
+                    "id": RAG_APP_ID,
+                    "prompt": "",
+                    "model": "bench-model",
+                    "chat_app_type": {
+                        "name": "rag",
+                        "input_dir": os.path.join(save_dir, "documents"),
+                        "vector_store_path": os.path.join(save_dir, "vectors"),
+                        "embed_model": "bench-embed",
+                    },
+                    "initial_messages": [],
+                },
+            ]
+        },
+        os.path.join(save_dir, "apps.json"),
+    )
+    os.environ[APP_PATH_VARIABLE] = save_dir
+    return save_dir
+
+
+async def run_tui_benchmarks(stub, sizes, selected):
+    """
+    Drives the TUI headlessly: sends messages to measure time-to-first-token
+    and tokens/s through handle_ki_response, and opens sessions to measure the
+    session switch time of change_chat.
+    """
+    from chat_manager import ChatManager
+    from chat_container_widget import ChatContainerWidget, ChatTextArea
+    from textual.widgets import Button
+
+    results = {}
+    app = ChatManager()
+    marks = {}
+    answered = asyncio.Event()
+
+    knowledge_interface = app.knowledge_interface
+    generate_response_stream = knowledge_interface.generate_response_stream
+
+    async def timed_response_stream(session, response_info=None):
+        async with aclosing(generate_response_stream(session, response_info)) as stream:
+            async for text in stream:
+                marks.setdefault("first_token", time.perf_counter())
+                yield text
+
+    knowledge_interface.generate_response_stream = timed_response_stream
+
+    session_manager = app.session_manager
+    add_assistant_message = session_manager.add_assistant_message
+
+    def timed_add_assistant_message(*args, **kwargs):
+        add_assistant_message(*args, **kwargs)
+        marks["done"] = time.perf_counter()
+        answered.set()
+
+    session_manager.add_assistant_message = timed_add_assistant_message
+
+    async with app.run_test(size=(160, 50)) as pilot:
+        await wait_for_warm_up(app, pilot)
+        container = app.query_one(ChatContainerWidget)
+
+        if "streaming" in selected:
+            first_tokens, totals, rates, overheads = [], [], [], []
+            expected = stub.latency + stub.answer_tokens / stub.token_rate
+            # the first turn opens the connection and is not counted
+            for turn in range(sizes["streaming_turns"] + 1):
+                marks.clear()
+                answered.clear()
+                app.query_one(ChatTextArea).text = f"question {turn}"
+                start = time.perf_counter()
+                app.query_one("#send-input-button", Button).press()
+                await asyncio.wait_for(answered.wait(), timeout=60)
+                if turn == 0:
+                    continue
+                first_tokens.append(marks["first_token"] - start)
+                totals.append(marks["done"] - start)
+                rates.append(
+                    stub.answer_tokens / (marks["done"] - marks["first_token"])
+                )
+                overheads.append(marks["done"] - start - expected)
+            results["streaming.ttft_p50_ms"] = metric(
+                percentile(first_tokens, 0.5) * 1000, "ms"
+            )
+            results["streaming.ttft_p95_ms"] = metric(
+                percentile(first_tokens, 0.95) * 1000, "ms"
+            )
+            results["streaming.tokens_per_s"] = metric(
+                statistics.mean(rates), "tokens/s", "higher"
+            )
+            results["streaming.total_p50_ms"] = metric(
+                percentile(totals, 0.5) * 1000, "ms"
+            )
+            results["streaming.overhead_p50_ms"] = metric(
+                percentile(overheads, 0.5) * 1000, "ms"
+            )
+
+        if "switch" in selected:
+            session_ids = [
+                session["id"]
+                for session in session_manager.get_all_sessions()
+                if session["id"] != session_manager.get_current_session_id()
+            ][: sizes["switch_sessions"]]
+
+            async def switch(session_id):
+                start = time.perf_counter()
+                container.save_scroll_state()
+                session_manager.set_current_session(session_id, "set_chat")
+                app.chat_container_update_trigger = time.time()
+                await pilot.pause()
+                assert container.rendered_session == session_id
+                return time.perf_counter() - start
+
+            cold = [await switch(session_id) for session_id in session_ids]
+            # views of recently opened sessions are cached
+            recent = session_ids[-min(len(session_ids), container.max_cached_views) :]
+            warm = [await switch(session_id) for session_id in recent[:-1]]
+            results["switch.cold_p50_ms"] = metric(percentile(cold, 0.5) * 1000, "ms")
+            results["switch.cold_max_ms"] = metric(max(cold) * 1000, "ms")
+            if warm:
+                results["switch.warm_p50_ms"] = metric(
+                    percentile(warm, 0.5) * 1000, "ms"
+                )
+    return results
+
+
+async def wait_for_warm_up(app, pilot):
+    """
+    Waits until the background warm-up after startup is done, so it does not
+    compete with the measured work. The startup trace is recorded once the
+    warm-up is done, or right after the first frame without a warm-up.
+    """
+    while app.startup_trace.end is None:
+        await pilot.pause(0.05)
+
+
+def run_startup_child():
+    """
+    Starts the TUI headlessly in a fresh interpreter and prints the time spent
+    importing it and the spans of its startup trace.
+    """
+    start = time.perf_counter()
+    from chat_manager import ChatManager
+
+    imported = time.perf_counter()
+
+    async def run():
+        app = ChatManager()
+        async with app.run_test(size=(160, 50)) as pilot:
+            await wait_for_warm_up(app, pilot)
+        return app.startup_trace
+
+    trace = asyncio.run(run())
+    spans = {span["name"]: span["duration_ms"] for span in trace.spans}
+    spans["import"] = (imported - start) * 1000
+    spans["ready"] = (
+        spans["import"] + spans["load"] + spans["mount"] + spans["first_frame"]
+    )
+    print(json.dumps(spans))
+
+
+def run_startup_benchmark(root, stub, sizes, repeat=3):
+    """
+    Measures the cold start of the TUI, from importing it to the first frame,
+    and the background warm-up of the RAG stack, with the session corpus of the
+    switch benchmark.
+    """
+    save_dir = prepare_save_dir(root, "startup", stub)
+    write_sessions(
+        save_dir, CHAT_APP_ID, sizes["switch_sessions"] + 1, sizes["switch_messages"]
+    )
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--startup-child"],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=os.environ,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        f"startup.{name}_ms": metric(statistics.median(run[name] for run in runs), "ms")
+        for name in ["import", "load", "mount", "first_frame", "ready", "warm_up"]
+    }
+
+
+def run_ingestion_benchmark(root, stub, sizes):
+    """
+    Measures the ingestion throughput of setup_rag on a fresh vector store, and
+    the time to sync an unchanged input directory.
+    """
+    save_dir = prepare_save_dir(root, "ingestion", stub)
+    write_documents(os.path.join(save_dir, "documents"), sizes["documents"])
+
+    from chat_app_manager import ChatAppManager
+    from knowledge_interface import KnowledgeInterface
+
+    chat_app_manager = ChatAppManager()
+    knowledge_interface = KnowledgeInterface(chat_app_manager)
+    chat_app = chat_app_manager.get_chat_app_by_id(RAG_APP_ID)
+
+    start = time.perf_counter()
+    engine = knowledge_interface.setup_rag(chat_app)
+    elapsed = time.perf_counter() - start
+    chunks = engine.ingestion_progress.chunks_done
+
+    knowledge_interface.engine_cache.clear()
+    start = time.perf_counter()
+    knowledge_interface.setup_rag(chat_app)
+    resync = time.perf_counter() - start
+    return {
+        "ingestion.seconds": metric(elapsed, "s"),
+        "ingestion.chunks_per_s": metric(chunks / elapsed, "chunks/s", "higher"),
+        "ingestion.documents_per_s": metric(
+            sizes["documents"] / elapsed, "documents/s", "higher"
+        ),
+        "ingestion.resync_ms": metric(resync * 1000, "ms"),
+    }
+
+
+def run_save_benchmark(root, stub, sizes, repeat=3):
+    """
+    Measures adding a message, save_sessions_to_disk and loading the sessions
+    for growing histories, with both session storage backends.
+    """
+    from session_manager import SessionManager
+
+    results = {}
+    messages_per_session = 100
+    for backend in ["journal", "sqlite"]:
+        for size in sizes["history_sizes"]:
+            prepare_save_dir(
+                root,
+                f"save-{backend}-{size}",
+                stub,
+                {"session_storage": {"backend": backend}},
+            )
+            write_sessions(
+                os.environ[APP_PATH_VARIABLE],
+                CHAT_APP_ID,
+                max(size // messages_per_session, 1),
+                messages_per_session,
+            )
+            session_manager = SessionManager()
+            adds, saves = [], []
+            for index in range(repeat):
+                start = time.perf_counter()
+                session_manager.add_user_message(f"message {index}")
+                adds.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                session_manager.save_sessions_to_disk()
+                saves.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            SessionManager()
+            load = time.perf_counter() - start
+
+            prefix = f"save.{backend}.{size}"
+            results[f"{prefix}.add_message_ms"] = metric(
+                statistics.median(adds) * 1000, "ms"
+            )
+            results[f"{prefix}.save_ms"] = metric(statistics.median(saves) * 1000, "ms")
+            results[f"{prefix}.load_ms"] = metric(load * 1000, "ms")
+    return results
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, report, threshold):
+    """
+    Prints every metric of both reports with its relative change and returns
+    the metrics that got worse by more than threshold.
+    """
+    regressions = []
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["value"]
+        new = result["value"]
+        change = (new - old) / old if old else 0.0
+        worse = change if result["better"] == "lower" else -change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = " !"
+        print(f"{name:<40} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the app against a local stub Ollama server."
+    )
+    parser.add_argument(
+        "-o", "--output", default="benchmark.json", help="report file to write"
+    )
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help=f"comma separated benchmarks to run ({', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="use small corpora for a fast run"
+    )
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change counted as a regression (default: 0.1)",
+    )
+    parser.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.startup_child:
+        run_startup_child()
+        return
+
+    selected = args.only.split(",")
+    sizes = SIZES["quick" if args.quick else "full"]
+    stub = StubOllama(
+        token_rate=args.token_rate,
+        latency=args.latency,
+        answer_tokens=args.answer_tokens,
+        embed_dim=args.embed_dim,
+        embed_latency=args.embed_latency,
+    )
+    results = {}
+    with stub, tempfile.TemporaryDirectory() as root:
+        if "startup" in selected:
+            results.update(run_startup_benchmark(root, stub, sizes))
+        if "ingestion" in selected:
+            results.update(run_ingestion_benchmark(root, stub, sizes))
+        if "save" in selected:
+            results.update(run_save_benchmark(root, stub, sizes))
+        if "streaming" in selected or "switch" in selected:
+            save_dir = prepare_save_dir(root, "tui", stub)
+            write_sessions(
+                save_dir,
+                CHAT_APP_ID,
+                sizes["switch_sessions"] + 1,
+                sizes["switch_messages"],
+            )
+            results.update(asyncio.run(run_tui_benchmarks(stub, sizes, selected)))
+
+    report = {
+        "commit": get_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "sizes": sizes,
+            "token_rate": args.token_rate,
+            "latency": args.latency,
+            "answer_tokens": args.answer_tokens,
+            "embed_dim": args.embed_dim,
+            "embed_latency": args.embed_latency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    for name, result in results.items():
+        print(f"{name:<40} {result['value']:>12.3f} {result['unit']}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        regressions = compare_reports(baseline, report, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} metrics regressed by more than "
+                f"{args.threshold:.0%}"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
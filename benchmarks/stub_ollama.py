@@ -0,0 +1,246 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class StubOllama:
+    """
+    A local HTTP server that answers the Ollama API endpoints used by the app,
+    so benchmarks do not depend on a model or a GPU.
+
+    Answers consist of answer_tokens words, streamed at token_rate tokens per
+    second after latency seconds. Embeddings are unit vectors of embed_dim
+    dimensions derived from a hash of the text, so equal texts get equal
+    embeddings; embed_latency is added to every embedding request.
+
+    For tests, the next embed_failures embedding requests fail with status 500,
+    and the batch sizes and the peak number of concurrent embedding requests
+    are recorded.
+    """
+
+    def __init__(
+        self,
+        port=0,
+        token_rate=200.0,
+        latency=0.05,
+        answer_tokens=100,
+        embed_dim=768,
+        embed_latency=0.0,
+    ):
+        self.token_rate = token_rate
+        self.latency = latency
+        self.answer_tokens = answer_tokens
+        self.embed_dim = embed_dim
+        self.embed_latency = embed_latency
+        self.embed_failures = 0
+        self.embed_batch_sizes = []
+        self.embeds_in_flight = 0
+        self.max_embeds_in_flight = 0
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.create_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def host(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count_request(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start_embed(self, texts):
+        """
+        Records an embedding request and returns False if it has to fail.
+        """
+        with self.lock:
+            if self.embed_failures > 0:
+                self.embed_failures -= 1
+                return False
+            self.embed_batch_sizes.append(len(texts))
+            self.embeds_in_flight += 1
+            self.max_embeds_in_flight = max(
+                self.max_embeds_in_flight, self.embeds_in_flight
+            )
+            return True
+
+    def finish_embed(self):
+        with self.lock:
+            self.embeds_in_flight -= 1
+
+    def embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.embed_dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def generate_tokens(self):
+        return [f"word{index} " for index in range(self.answer_tokens)]
+
+    def create_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_chunk(self, data):
+                line = (json.dumps(data) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_GET(self):
+                stub.count_request(self.path)
+                if self.path == "/api/tags":
+                    self.send_json({"models": []})
+                else:
+                    self.send_json({"version": "0.0.0"})
+
+            def do_POST(self):
+                stub.count_request(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path in ["/api/chat", "/api/generate"]:
+                    self.answer(request, chat=self.path == "/api/chat")
+                elif self.path == "/api/embed":
+                    texts = request["input"]
+                    texts = texts if isinstance(texts, list) else [texts]
+                    if not stub.start_embed(texts):
+                        self.send_json({"error": "stub failure"}, status=500)
+                        return
+                    try:
+                        time.sleep(stub.embed_latency)
+                        embeddings = [stub.embed(text) for text in texts]
+                    finally:
+                        stub.finish_embed()
+                    self.send_json(
+                        {"model": request.get("model"), "embeddings": embeddings}
+                    )
+                elif self.path == "/api/embeddings":
+                    time.sleep(stub.embed_latency)
+                    self.send_json({"embedding": stub.embed(request["prompt"])})
+                elif self.path == "/api/show":
+                    self.send_json(
+                        {
+                            "model_info": {"llama.context_length": 8192},
+                            "capabilities": ["completion"],
+                        }
+                    )
+                else:
+                    self.send_json({})
+
+            def answer(self, request, chat):
+                model = request.get("model")
+                tokens = stub.generate_tokens()
+                started = time.perf_counter_ns()
+
+                def chunk(text, done):
+                    data = {
+                        "model": model,
+                        "created_at": "2024-01-01T00:00:00Z",
+                        "done": done,
+                    }
+                    if chat:
+                        data["message"] = {"role": "assistant", "content": text}
+                    else:
+                        data["response"] = text
+                    if done:
+                        duration = time.perf_counter_ns() - started
+                        data.update(
+                            {
+                                "done_reason": "stop",
+                                "total_duration": duration,
+                                "load_duration": 0,
+                                "prompt_eval_count": len(json.dumps(request)) // 4,
+                                "prompt_eval_duration": int(stub.latency * 1e9),
+                                "eval_count": len(tokens),
+                                "eval_duration": max(
+                                    duration - int(stub.latency * 1e9), 1
+                                ),
+                            }
+                        )
+                    return data
+
+                time.sleep(stub.latency)
+                if not request.get("stream", True):
+                    time.sleep(len(tokens) / stub.token_rate)
+                    self.send_json(chunk("".join(tokens), True))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for index, token in enumerate(tokens):
+                        # sleep until the token is due, so the rate does not
+                        # drift with the time spent writing
+                        due = started / 1e9 + stub.latency + index / stub.token_rate
+                        time.sleep(max(0.0, due - time.perf_counter()))
+                        self.send_chunk(chunk(token, False))
+                    self.send_chunk(chunk("", True))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs a stub Ollama server for benchmarks and manual testing."
+    )
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubOllama(
+        args.port,
+        args.token_rate,
+        args.latency,
+        args.answer_tokens,
+        args.embed_dim,
+        args.embed_latency,
+    )
+    print(f"Stub Ollama listening on {stub.host}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from util import get_app_save_dir, load_data, save_data
+from util import get_app_save_dir, load_data, save_data, get_file_mtime
 
 
 class ChatAppManager:
@@ -7,15 +7,24 @@ class ChatAppManager:
         self.load_chat_apps_from_disk()
 
     def load_chat_apps_from_disk(self):
-        apps_path = os.path.join(self.get_apps_save_dir(), "apps.json")
+        apps_path = self.get_apps_path()
         self.chat_apps = load_data(apps_path) or {"apps": []}
+        self.apps_mtime = get_file_mtime(apps_path)
+
+    def reload_chat_apps_if_changed(self):
+        if get_file_mtime(self.get_apps_path()) == self.apps_mtime:
+            return False
+        self.load_chat_apps_from_disk()
+        return True
 
     def get_apps_save_dir(self):
         return get_app_save_dir("ollama-rag-tui")
 
+    def get_apps_path(self):
+        return os.path.join(self.get_apps_save_dir(), "apps.json")
+
     def save_chat_apps_to_disk(self):
-        apps_path = os.path.join(self.get_apps_save_dir(), "apps.json")
-        save_data(self.chat_apps, apps_path)
+        save_data(self.chat_apps, self.get_apps_path())
 
     def get_formatted_chat_app_previews_list(self):
         max_id_length = max(len(app["id"]) for app in self.chat_apps["apps"])
@@ -4,19 +4,43 @@ from textual.widgets import ListItem, Button, TextArea, ListView, Markdown
 from textual.containers import Horizontal
 from textual.widget import Widget
 import asyncio
+from collections import OrderedDict
 from textual.binding import Binding, BindingType
+from textual import on
+from textual.events import MouseScrollDown, MouseScrollUp
 
+from markdown_stream import MarkdownStreamRenderer
 from chat_message_event import (
     SaveAndQuitMessage,
     FocusChatTextArea,
     FocusSidebar,
     FocusChatContainer,
+    ChatPageRequested,
+    SessionUpdated,
+    StopGeneration,
 )
+from generation_stats import format_stats
+from tracing import get_trace
+from util import get_setting
+
+RENDERED_BYTES_PER_CHARACTER = 64
+RENDERED_BYTES_PER_MESSAGE = 16 * 1024
+
+
+def get_message_subtitle(cached, stats):
+    if cached:
+        return "cached"
+    if stats:
+        return format_stats(stats)
+    return None
 
 
 class ChatContainerWidget(Widget):
     """
     The container widget that displays the chat messages and input field.
+
+    The rendered views of recently opened sessions are kept mounted but hidden
+    in an LRU cache, so switching back to them does not re-render anything.
     """
 
     chat_container_update_trigger = reactive("")
@@ -26,6 +50,16 @@ class ChatContainerWidget(Widget):
         self.session_manager = session_manager
         self.ki = ki
         self.rendered_session = None
+        self.page_size = get_setting("rendering", "page_size", 50)
+        self.max_mounted_messages = self.page_size * 3
+        self.max_cached_views = get_setting("rendering", "max_cached_views", 8)
+        self.view_cache_budget = (
+            get_setting("rendering", "view_cache_mb", 64) * 1024 * 1024
+        )
+        self.views = OrderedDict()
+        self.page_lock = asyncio.Lock()
+        self.generating = set()
+        self.tasks = {}
 
     def watch_chat_container_update_trigger(self, data) -> None:
         """
@@ -38,9 +72,7 @@ class ChatContainerWidget(Widget):
         Composes the chat container user interface.
         """
         self.rendered_session = self.session_manager.get_current_session_id()
-        self.container = ChatListView(
-            *self.generate_current_chat_messages(), id="chatcontainer-listview"
-        )
+        self.container = self.create_chat_view(mount_messages=False)
         yield self.container
 
         self.chatinput = ChatTextArea(
@@ -49,36 +81,75 @@ class ChatContainerWidget(Widget):
         yield self.chatinput
         yield Horizontal(
             Button("Send", id="send-input-button"),
+            Button("Stop", id="stop-generation-button"),
             Button("Clear input", id="clear-input-button"),
             id="textarea-button-container",
         )
-        self.container.scroll_to(
+
+    def on_mount(self) -> None:
+        """
+        Mounts the messages of the open session after the first frame, so the
+        rest of the UI does not wait for the Markdown to render.
+        """
+        self.call_after_refresh(self.show_initial_messages, self.container)
+
+    async def show_initial_messages(self, view):
+        async with self.page_lock:
+            await self.show_window(view, view.window_start)
+        view.scroll_to(
             y=self.session_manager.get_current_session_scrollpos(), animate=False
         )
 
-    def generate_current_chat_messages(self):
+    def create_chat_view(self, mount_messages=True):
         """
-        Generates the chat widget for the current session.
+        Creates the chat view for the current session and adds it to the cache.
+
+        Only a window of at most max_mounted_messages is mounted; older and
+        newer messages are paged in while scrolling. Without mount_messages,
+        the view starts empty and the window is shown later with show_window.
         """
+        session_id = self.session_manager.get_current_session_id()
+        total = self.session_manager.get_session_message_count(session_id)
+        window_start = self.session_manager.get_current_session_window_start()
+        if window_start is None or window_start >= total:
+            window_start = max(total - self.page_size, 0)
         messages = []
-        current_messages = self.session_manager.get_messages_for_current_session()
-        if current_messages:
-            for message in current_messages:
-                chat_message_widget = self.create_chat_message_widget(
-                    message["role"],
-                    message["content"],
-                    message["timestamp"],
-                    message["id"],
-                )
-                messages.append(chat_message_widget)
-            return messages
-        return []
+        if mount_messages:
+            messages = self.session_manager.get_session_messages(
+                session_id, window_start, self.max_mounted_messages
+            )
+        view = ChatListView(
+            *self.generate_chat_messages(messages),
+            classes="chatcontainer-listview",
+        )
+        view.session_id = session_id
+        view.window_start = window_start
+        view.version = self.session_manager.get_session_version(session_id)
+        self.views[session_id] = view
+        return view
+
+    def generate_chat_messages(self, messages):
+        """
+        Generates the chat widgets for the given messages.
+        """
+        return [
+            self.create_chat_message_widget(
+                message["role"],
+                message["content"],
+                message["timestamp"],
+                message["id"],
+                cached=message.get("cached", False),
+                stats=message.get("stats"),
+            )
+            for message in messages
+        ]
 
     def create_chat_message_widget(
-        self, role, content, timestamp, message_id, classes=""
+        self, role, content, timestamp, message_id, classes="", cached=False, stats=None
     ):
         """
-        Creates a chat box widget for a message.
+        Creates a chat box widget for a message. Answers show whether they were
+        cached and their generation speed below the message.
         """
         chat_message = Markdown(
             content,
@@ -86,6 +157,7 @@ class ChatContainerWidget(Widget):
             id=message_id,
         )
         chat_message.border_title = f"{role} ({timestamp})"
+        chat_message.border_subtitle = get_message_subtitle(cached, stats)
         chat_message_item = StaticItem(
             chat_message,
             id=f"chat_message_item_{message_id}",
@@ -103,62 +175,300 @@ class ChatContainerWidget(Widget):
         if last_action["action"] == "set_chat" or last_action["action"] == "add_chat":
             self.change_chat()
         if last_action["action"] == "add_message":
-            self.chat(last_action["data"])
+            self.generating.add(last_action["data"]["id"])
+            self.run_worker(self.chat(last_action["data"]))
 
-    def chat(self, session):
+    def is_generating(self, session_id):
         """
-        Adds a new message to the chat and generates a response from the AI.
+        Checks if a response for the session is still being generated.
+        """
+        return session_id in self.generating
+
+    async def chat(self, session):
         """
+        Adds a new message to the chat and generates a response from the AI.
+
+        The response streams in the background into the view of the session,
+        so it continues while other sessions are opened.
+        """
+        view = self.views[session["id"]]
+        view.streaming = True
+        self.query_one(ChatTextArea).text = ""
+        async with self.page_lock:
+            if self.has_newer_messages(view, offset=-1):
+                window_start = self.get_tail_window_start(view, offset=-1)
+                await self.show_window(
+                    view, window_start, self.get_message_count(view) - 1 - window_start
+                )
         chat_box = self.create_chat_message_widget(
             session["messages"][-1]["role"],
             session["messages"][-1]["content"],
             session["messages"][-1]["timestamp"],
             session["messages"][-1]["id"],
         )
-        self.container.append(chat_box)
-        self.container.scroll_end(animate=False)
+        view.append(chat_box)
+        view.scroll_end(animate=False)
+        view.version = self.session_manager.get_session_version(session["id"])
 
-        role, timestamp, id = self.session_manager.generate_empty_assistant_message()
+        role, timestamp, id = self.session_manager.generate_empty_assistant_message(
+            session["id"]
+        )
         assistant_chat_box = self.create_chat_message_widget(
             role,
             "",
             timestamp,
             id,
         )
-        self.container.append(assistant_chat_box)
+        view.append(assistant_chat_box)
 
         async def handle_ki_response(widget, session):
-            chattextarea = self.query_one(ChatTextArea)
-            send_button = self.query_one("#send-input-button")
-            chattextarea.text = ""
-            chattextarea.disabled = True
-            send_button.disabled = True
-            content = ""
-            async for chunk in self.ki.generate_response_stream(session):
-                content += chunk
-                widget.item.update(content.strip())
-                self.container.scroll_end(animate=False)
-
-            chattextarea.disabled = False
-            send_button.disabled = False
-            self.session_manager.add_assistant_message(content, timestamp, id)
-            chattextarea.focus()
-
-        asyncio.create_task(handle_ki_response(assistant_chat_box, session))
+            renderer = MarkdownStreamRenderer(
+                widget.item, lambda: view.scroll_end(animate=False)
+            )
+            response_info = {}
+            error = None
+            stream = self.ki.generate_response_stream(session, response_info)
+            try:
+                async for chunk in stream:
+                    await renderer.write(chunk)
+            except asyncio.CancelledError:
+                pass
+            except Exception as exception:
+                # failed responses are still persisted, so the placeholder's
+                # message id is not handed out again
+                error = exception
+                message = str(exception) or type(exception).__name__
+                await renderer.write(f"\n\n**Error:** {message}")
+            finally:
+                await stream.aclose()
+                await renderer.flush()
+                view.streaming = False
+                self.generating.discard(session["id"])
+                self.tasks.pop(session["id"], None)
+
+            cached = response_info.get("cached", False)
+            stats = response_info.get("stats")
+            trace = get_trace(response_info)
+            content = renderer.get_content().strip()
+            if content:
+                widget.item.border_subtitle = get_message_subtitle(cached, stats)
+                with trace.span("persist"):
+                    self.session_manager.add_assistant_message(
+                        session["id"],
+                        content,
+                        timestamp,
+                        id,
+                        cached,
+                        stats,
+                        error=error is not None,
+                    )
+            else:
+                # stopped before the first token, so there is no answer to keep
+                await widget.remove()
+            if error is None:
+                self.ki.tracer.record(trace)
+            view.version = self.session_manager.get_session_version(session["id"])
+            self.post_message(SessionUpdated(session))
+            # the widget is gone if the app quit while the response finished
+            if view is self.container and self.is_attached:
+                for text_area in self.query(ChatTextArea):
+                    text_area.focus()
+
+        task = asyncio.create_task(handle_ki_response(assistant_chat_box, session))
+        task.add_done_callback(self.report_task_error)
+        self.tasks[session["id"]] = task
+
+    def report_task_error(self, task):
+        """
+        Shows errors that escaped a response task, which nothing awaits.
+        """
+        if not task.cancelled() and task.exception() is not None:
+            self.notify(
+                str(task.exception()), title="Response failed", severity="error"
+            )
+
+    async def stop_all_generations(self):
+        """
+        Cancels the responses of all sessions and waits until their partial
+        answers are saved.
+        """
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @on(StopGeneration)
+    def stop_generation(self):
+        """
+        Cancels the response of the current session. The part that was already
+        generated is kept as the answer, unless nothing was generated yet.
+        """
+        task = self.tasks.get(self.rendered_session)
+        if task:
+            task.cancel()
 
     def change_chat(self):
         """
-        Changes the chat to the current session.
+        Changes the chat to the current session, reusing its cached view if it
+        is still up to date.
         """
-        if self.rendered_session == self.session_manager.get_current_session_id():
+        session_id = self.session_manager.get_current_session_id()
+        if self.rendered_session == session_id:
             return
 
-        self.container.clear()
-        self.container.extend(self.generate_current_chat_messages())
-        self.container.scroll_to(
-            y=self.session_manager.get_current_session_scrollpos(), animate=False
+        self.container.display = False
+        view = self.views.get(session_id)
+        if view is not None and (
+            view.version != self.session_manager.get_session_version(session_id)
+        ):
+            self.remove_chat_view(session_id)
+            view = None
+
+        if view is None:
+            view = self.create_chat_view()
+            self.mount(view, before=self.chatinput)
+            view.scroll_to(
+                y=self.session_manager.get_current_session_scrollpos(), animate=False
+            )
+        else:
+            self.views.move_to_end(session_id)
+            view.display = True
+
+        self.container = view
+        self.rendered_session = session_id
+        self.evict_chat_views()
+
+    def remove_chat_view(self, session_id):
+        """
+        Removes the cached view of the given session.
+        """
+        self.views.pop(session_id).remove()
+
+    def evict_chat_views(self):
+        """
+        Removes least recently used views until the cache fits its budget.
+
+        The displayed view and views with a streaming answer are never evicted.
+        """
+        evictable = [
+            session_id
+            for session_id, view in self.views.items()
+            if view is not self.container and not view.streaming
+        ]
+        while evictable and (
+            len(self.views) > self.max_cached_views
+            or sum(view.estimate_size() for view in self.views.values())
+            > self.view_cache_budget
+        ):
+            self.remove_chat_view(evictable.pop(0))
+
+    def save_scroll_state(self):
+        """
+        Saves the scroll position and message window of the current session.
+        """
+        self.session_manager.set_current_session_scrollpos(
+            self.container.scroll_y, self.container.window_start
         )
-        self.rendered_session = self.session_manager.get_current_session_id()
+
+    def get_message_count(self, view):
+        return self.session_manager.get_session_message_count(view.session_id)
+
+    def get_tail_window_start(self, view, offset=0):
+        return max(self.get_message_count(view) + offset - self.page_size, 0)
+
+    def has_newer_messages(self, view, offset=0):
+        """
+        Checks if messages after the mounted window exist. The offset accounts
+        for messages that are already counted but not mounted yet.
+        """
+        return view.window_start + len(view) < self.get_message_count(view) + offset
+
+    @on(ChatPageRequested)
+    async def page_messages(self, event: ChatPageRequested):
+        """
+        Pages older or newer messages into the mounted window.
+        """
+        view = self.container
+        async with self.page_lock:
+            if event.direction == "older":
+                await self.load_older_messages(view)
+            elif event.direction == "newer":
+                await self.load_newer_messages(view)
+            elif event.direction == "first":
+                if view.window_start > 0 and not view.streaming:
+                    await self.show_window(view, 0)
+                view.index = 0
+            elif event.direction == "last":
+                if self.has_newer_messages(view):
+                    await self.show_window(view, self.get_tail_window_start(view))
+                view.index = len(view) - 1
+
+    async def show_window(self, view, window_start, count=None):
+        """
+        Replaces the mounted messages with the window starting at window_start.
+        """
+        view.window_start = window_start
+        await view.clear()
+        await view.extend(
+            self.generate_chat_messages(
+                self.session_manager.get_session_messages(
+                    view.session_id,
+                    window_start,
+                    min(count or self.max_mounted_messages, self.max_mounted_messages),
+                )
+            )
+        )
+
+    async def load_older_messages(self, view):
+        """
+        Prepends the previous page and unmounts messages beyond the window size
+        at the bottom.
+        """
+        if view.window_start == 0:
+            return
+        start = max(view.window_start - self.page_size, 0)
+        items = self.generate_chat_messages(
+            self.session_manager.get_session_messages(
+                view.session_id, start, view.window_start - start
+            )
+        )
+        anchor = view.children[0] if len(view) else None
+        await view.insert(0, items)
+        view.window_start = start
+        if view.index is not None:
+            view.index += len(items)
+
+        excess = len(view) - self.max_mounted_messages
+        if excess > 0 and not view.streaming:
+            count = len(view)
+            await view.remove_items(range(count - excess, count))
+        if anchor:
+            view.call_after_refresh(
+                view.scroll_to_widget, anchor, top=True, animate=False
+            )
+
+    async def load_newer_messages(self, view):
+        """
+        Appends the next page and unmounts messages beyond the window size at
+        the top.
+        """
+        if not self.has_newer_messages(view):
+            return
+        start = view.window_start + len(view)
+        items = self.generate_chat_messages(
+            self.session_manager.get_session_messages(
+                view.session_id, start, self.page_size
+            )
+        )
+        anchor = view.children[-1] if len(view) else None
+        await view.extend(items)
+
+        excess = len(view) - self.max_mounted_messages
+        if excess > 0:
+            await view.remove_items(range(excess))
+            view.window_start += excess
+        if anchor:
+            view.call_after_refresh(view.scroll_to_widget, anchor, animate=False)
 
 
 class StaticItem(ListItem):
@@ -179,7 +489,7 @@ class StaticItem(ListItem):
 
 class ChatListView(ListView):
     """
-    A list view for displaying chat messages.
+    A list view for displaying a window of the chat messages of one session.
     """
 
     BINDINGS: list[BindingType] = [
@@ -192,6 +502,7 @@ class ChatListView(ListView):
         Binding("0,g", "focus_first_element", "First Message", show=True),
         Binding("G", "focus_last_element", "Last Message", show=True),
         Binding("s,S,ctrl+s", "send_message", "send Message", show=True),
+        Binding("x,ctrl+g", "stop_generation", "Stop", show=True),
     ]
 
     def action_save_and_quit(self):
@@ -212,17 +523,64 @@ class ChatListView(ListView):
         """
         self.post_message(FocusSidebar())
 
+    def __init__(self, *items, **kw):
+        super().__init__(*items, **kw)
+        self.session_id = None
+        self.window_start = 0
+        self.version = 0
+        self.streaming = False
+
+    def estimate_size(self):
+        """
+        Returns a rough estimate of the memory used by the rendered messages.
+        """
+        characters = sum(len(item.item.source) for item in self.children)
+        return (
+            characters * RENDERED_BYTES_PER_CHARACTER
+            + len(self) * RENDERED_BYTES_PER_MESSAGE
+        )
+
+    def on_mouse_scroll_up(self, event: MouseScrollUp) -> None:
+        """
+        Requests older messages when scrolling up at the top of the list.
+        """
+        if self.scroll_y <= 0:
+            self.post_message(ChatPageRequested("older"))
+
+    def on_mouse_scroll_down(self, event: MouseScrollDown) -> None:
+        """
+        Requests newer messages when scrolling down at the bottom of the list.
+        """
+        if self.scroll_y >= self.max_scroll_y:
+            self.post_message(ChatPageRequested("newer"))
+
+    def action_cursor_up(self):
+        """
+        Moves the cursor up, paging in older messages at the top.
+        """
+        if self.index == 0:
+            self.post_message(ChatPageRequested("older"))
+        super().action_cursor_up()
+
+    def action_cursor_down(self):
+        """
+        Moves the cursor down, paging in newer messages at the bottom.
+        """
+        if self.index == len(self) - 1:
+            self.post_message(ChatPageRequested("newer"))
+        super().action_cursor_down()
+
     def action_focus_first_element(self):
         """
-        Focus the first element in the list
+        Focus the first message of the session
         """
-        self.index = 0
+        self.post_message(ChatPageRequested("first"))
 
     def action_focus_last_element(self):
         """
-        Focus the first element in the list
+        Focus the last message of the session
         """
-        self.index = len(self.children) - 1
+        self.post_message(ChatPageRequested("last"))
 
     def action_send_message(self):
         """
@@ -231,12 +589,19 @@ class ChatListView(ListView):
         dummy = Button(id="send-input-button")
         self.post_message(Button.Pressed(dummy))
 
+    def action_stop_generation(self):
+        """
+        Stops the response that is being generated
+        """
+        self.post_message(StopGeneration())
+
 
 class ChatTextArea(TextArea):
     BINDINGS = [
         Binding("escape", "exit_insert", "Exit insert", show=True),
         Binding("ctrl+q", "save_and_quit", "Save + Quit", show=True),
         Binding("ctrl+s", "send_message", "Send", show=True),
+        Binding("ctrl+g", "stop_generation", "Stop", show=True),
         Binding("ctrl+a", "select_all", "Select all", show=True),
     ]
 
@@ -258,3 +623,9 @@ class ChatTextArea(TextArea):
         """
         dummy = Button(id="send-input-button")
         self.post_message(Button.Pressed(dummy))
+
+    def action_stop_generation(self):
+        """
+        Stops the response that is being generated
+        """
+        self.post_message(StopGeneration())
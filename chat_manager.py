@@ -1,9 +1,11 @@
 from textual.app import App, ComposeResult
+from textual.binding import Binding
 from textual.reactive import reactive
 from textual.widgets import Header, Footer, Button, TextArea
 from textual.containers import Horizontal
 from datetime import datetime
 from textual import on
+import time
 
 from chat_app_manager import ChatAppManager
 from knowledge_interface import KnowledgeInterface
@@ -11,12 +13,16 @@ from sidebar_widget import SidebarWidget
 from chat_container_widget import ChatContainerWidget, ChatTextArea
 from new_chat_session_screen import NewChatSessionScreen
 from new_chat_app_screen import NewChatAppScreen
+from performance_screen import PerformanceScreen
 from session_manager import SessionManager
+from tracing import Trace
+from util import get_setting
 from chat_message_event import (
     FocusChatTextArea,
     FocusChatContainer,
     SaveAndQuitMessage,
     FocusSidebar,
+    SessionUpdated,
 )
 
 
@@ -26,12 +32,27 @@ class ChatManager(App):
     """
 
     CSS_PATH = "chat.tcss"
-    session_manager = SessionManager()
-    chat_app_manager = ChatAppManager()
-    knowledge_interface = KnowledgeInterface(chat_app_manager)
+    # replaces the App's own priority ctrl+q, which would quit without saving
+    BINDINGS = [
+        Binding("ctrl+q", "save_and_quit", "Save + Quit", show=False, priority=True),
+        Binding("f2", "show_performance", "Performance", show=True),
+    ]
     sidebar_update_trigger = reactive("")
     chat_container_update_trigger = reactive("")
 
+    def __init__(self, **kw):
+        """
+        Loads the sessions and apps. The RAG stack is imported in the background
+        once the first frame is drawn, or when a RAG app is first used.
+        """
+        self.startup_trace = Trace("startup")
+        self.startup_mark = self.startup_trace.start
+        super().__init__(**kw)
+        self.session_manager = SessionManager()
+        self.chat_app_manager = ChatAppManager()
+        self.knowledge_interface = KnowledgeInterface(self.chat_app_manager)
+        self.mark_startup("load")
+
     def compose(self) -> ComposeResult:
         """
         Composes the user interface.
@@ -48,6 +69,83 @@ class ChatManager(App):
         yield Header(id="header")
         yield Footer()
 
+    def on_mount(self) -> None:
+        """
+        Connects the knowledge interface to the user interface.
+        """
+        self.knowledge_interface.progress_callback = self.show_ingestion_progress
+        self.knowledge_interface.scheduler.state_callback = self.show_generation_state
+        self.knowledge_interface.tracer.callback = self.show_trace
+        self.mark_startup("mount")
+        self.call_after_refresh(self.finish_startup)
+
+    def mark_startup(self, name):
+        """
+        Adds the time since the previous startup phase as a span to the startup
+        trace.
+        """
+        now = time.perf_counter()
+        self.startup_trace.add_span(name, self.startup_mark, now)
+        self.startup_mark = now
+
+    def finish_startup(self):
+        """
+        Records the startup trace once the first frame is drawn and starts the
+        warm-up of the RAG stack.
+        """
+        self.mark_startup("first_frame")
+        self.sub_title = f"Ready in {self.startup_mark - self.startup_trace.start:.2f}s"
+        if get_setting("startup", "warm_up", True):
+            self.run_worker(self.warm_up, thread=True, exit_on_error=False)
+        else:
+            self.knowledge_interface.tracer.record(self.startup_trace)
+
+    def warm_up(self):
+        """
+        Imports the RAG stack in a worker thread, so neither the first frame nor
+        the first question waits for it.
+        """
+        start = time.perf_counter()
+        try:
+            self.knowledge_interface.warm_up()
+        finally:
+            self.startup_trace.add_span("warm_up", start, time.perf_counter())
+            self.call_from_thread(
+                self.knowledge_interface.tracer.record, self.startup_trace
+            )
+
+    def show_ingestion_progress(self, progress):
+        """
+        Shows the embedding progress of a running ingestion in the header.
+        Called from the ingestion worker threads.
+        """
+        self.call_from_thread(setattr, self, "sub_title", str(progress))
+
+    def show_trace(self, trace):
+        """
+        Shows where the time of the last response in the open session went in
+        the header.
+        """
+        if (
+            trace.session_id is not None
+            and trace.session_id == self.session_manager.get_current_session_id()
+        ):
+            self.sub_title = trace.format_readout()
+
+    def show_generation_state(self, session_id, state):
+        """
+        Shows whether the response of a session is queued, running or finished
+        in the sidebar. Finished responses of the open session need no marker.
+        """
+        if (
+            state in ["done", "cancelled"]
+            and session_id == self.session_manager.get_current_session_id()
+        ):
+            state = None
+        # responses can still finish while the app shuts down
+        for sidebar in self.query(SidebarWidget):
+            sidebar.set_generation_state(session_id, state)
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """
         Handles button press events.
@@ -68,12 +166,20 @@ class ChatManager(App):
 
         if pressed_id == "send-input-button":
             input_text = self.query_one(ChatTextArea).text
-            if input_text.strip():
+            if self.query_one(ChatContainerWidget).is_generating(
+                self.session_manager.get_current_session_id()
+            ):
+                self.notify("Wait for the response to this chat to finish...")
+            elif input_text.strip():
                 self.session_manager.add_user_message(input_text)
                 self.chat_container_update_trigger = datetime.now()
+                self.sidebar_update_trigger = datetime.now()
             else:
                 self.notify("Cannot send empty input...")
 
+        if pressed_id == "stop-generation-button":
+            self.query_one(ChatContainerWidget).stop_generation()
+
         if pressed_id == "clear-input-button":
             self.query_one(ChatTextArea).clear()
 
@@ -94,24 +200,45 @@ class ChatManager(App):
         """
         selected_id = selected.control.id
         if selected_id == "sidebar-listview":
-            current_scroll_pos = self.query_one("#chatcontainer-listview").scroll_y
-            self.session_manager.set_current_session_scrollpos(current_scroll_pos)
+            self.query_one(ChatContainerWidget).save_scroll_state()
             self.session_manager.set_current_session(
                 selected.item.children[0].id, "set_chat"
             )
+            self.query_one(SidebarWidget).clear_generation_state(
+                selected.item.children[0].id
+            )
             self.chat_container_update_trigger = datetime.now()
 
+    def action_show_performance(self):
+        """
+        Shows the generation stats per model and app.
+        """
+        self.push_screen(PerformanceScreen(self.knowledge_interface.generation_stats))
+
+    def action_save_and_quit(self):
+        """
+        Triggers the save and quit action.
+        """
+        self.post_message(SaveAndQuitMessage())
+
     @on(SaveAndQuitMessage)
-    def save_and_quit(self):
+    async def save_and_quit(self):
         """
-        Saves the sessions and quits the application.
+        Stops running responses, saves the sessions and quits the application.
         """
-        current_scroll_pos_session = self.query_one("#chatcontainer-listview").scroll_y
-        self.session_manager.set_current_session_scrollpos(current_scroll_pos_session)
-        current_scroll_pos_sidebar = self.query_one("#sidebar-listview").scroll_y
-        self.session_manager.set_sidebar_scrollpos(current_scroll_pos_sidebar)
+        await self.query_one(ChatContainerWidget).stop_all_generations()
+        self.query_one(ChatContainerWidget).save_scroll_state()
+        self.query_one(SidebarWidget).save_scroll_state()
+        self.session_manager.save_sessions_to_disk()
         self.exit(0)
 
+    @on(SessionUpdated)
+    def update_session_preview(self, event: SessionUpdated):
+        """
+        Refreshes the sidebar preview of a session that received a response.
+        """
+        self.query_one(SidebarWidget).update_session_preview(event.session)
+
     @on(FocusChatTextArea)
     def focus_textarea(self):
         """
@@ -124,7 +251,7 @@ class ChatManager(App):
         """
         Focus the chat container
         """
-        self.query_one("#chatcontainer-listview").focus()
+        self.query_one(ChatContainerWidget).container.focus()
 
     @on(FocusSidebar)
     def focus_sidebar(self):
@@ -15,3 +15,37 @@ class FocusChatContainer(Message):
 
 class FocusSidebar(Message):
     pass
+
+
+class ChatPageRequested(Message):
+    """
+    Requests another page of chat messages: "older", "newer", "first" or "last".
+    """
+
+    def __init__(self, direction):
+        self.direction = direction
+        super().__init__()
+
+
+class SessionPageRequested(Message):
+    """
+    Requests another page of sessions: "older", "newer", "first" or "last".
+    """
+
+    def __init__(self, direction):
+        self.direction = direction
+        super().__init__()
+
+
+class SessionUpdated(Message):
+    """
+    Posted when a response was added to a session.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        super().__init__()
+
+
+class StopGeneration(Message):
+    pass
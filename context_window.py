@@ -0,0 +1,164 @@
+DEFAULT_MAX_TOKENS = 4096
+DEFAULT_RESERVE_TOKENS = 1024
+DEFAULT_SUMMARY_TOKENS = 256
+DEFAULT_TRIM_RATIO = 0.75
+CHARACTERS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences. Keep names, "
+    "facts and decisions that later messages may refer to."
+)
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens of a text without running a tokenizer.
+    """
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+class ContextWindow:
+    """
+    Selects the messages of a chat session that are sent to the model.
+
+    System and initial messages of the app are always kept. The remaining token
+    budget is filled with the most recent turns; older turns are dropped and,
+    if enabled, replaced by a rolling summary.
+
+    When the history overflows, it is trimmed to trim_ratio of the budget so the
+    first messages of the prompt stay the same for the next turns. The model can
+    then reuse its cached prompt prefix, and the summary only has to be updated
+    every few turns.
+    """
+
+    def __init__(self, chat_app, summarize=None):
+        config = chat_app["chat_app_type"].get("context", {})
+        self.max_tokens = config.get("max_tokens", DEFAULT_MAX_TOKENS)
+        self.reserve_tokens = config.get("reserve_tokens", DEFAULT_RESERVE_TOKENS)
+        self.trim_ratio = config.get("trim_ratio", DEFAULT_TRIM_RATIO)
+        self.summary_tokens = config.get("summary_tokens", DEFAULT_SUMMARY_TOKENS)
+        self.summarize = summarize if config.get("summarize", False) else None
+        self.initial_message_count = len(chat_app["initial_messages"])
+        self.token_counts = {}
+        self.boundaries = {}
+        self.summaries = {}
+
+    def count_tokens(self, message):
+        """
+        Returns the token count of a message, cached by message id.
+        """
+        key = message.get("id") or message["content"]
+        count = self.token_counts.get(key)
+        if count is None:
+            count = estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            self.token_counts[key] = count
+        return count
+
+    def is_pinned(self, index, message):
+        return index < self.initial_message_count or message["role"] == "system"
+
+    async def build_messages(self, session):
+        """
+        Returns the messages of the session that fit into the context window.
+        """
+        messages = session["messages"]
+        pinned = [m for i, m in enumerate(messages) if self.is_pinned(i, m)]
+        # failed responses are kept in the session but never sent to the model
+        history = [
+            (i, m)
+            for i, m in enumerate(messages)
+            if not self.is_pinned(i, m) and not m.get("error")
+        ]
+
+        budget = self.max_tokens - self.reserve_tokens
+        budget -= sum(self.count_tokens(message) for message in pinned)
+        if self.summarize:
+            budget -= self.summary_tokens
+
+        boundary = self.get_boundary(session["id"], history, budget)
+        kept = [message for i, message in history if i >= boundary]
+        dropped = [message for i, message in history if i < boundary]
+
+        summary = []
+        if dropped and self.summarize:
+            summary = [
+                {
+                    "role": "system",
+                    "content": "Summary of the earlier conversation: "
+                    + await self.get_summary(session["id"], dropped),
+                }
+            ]
+        return pinned + summary + kept
+
+    def get_boundary(self, session_id, history, budget):
+        """
+        Returns the index of the oldest history message that is kept.
+
+        The previous boundary is reused as long as the kept messages fit into
+        the budget. Otherwise the oldest messages are dropped until they fit into
+        trim_ratio of the budget; the latest message is always kept.
+        """
+        boundary = self.boundaries.get(session_id, 0)
+        kept = [(i, m) for i, m in history if i >= boundary]
+        total = sum(self.count_tokens(message) for _, message in kept)
+        if total > budget:
+            target = budget * self.trim_ratio
+            start = 0
+            while start < len(kept) - 1 and total > target:
+                total -= self.count_tokens(kept[start][1])
+                start += 1
+            if kept:
+                boundary = kept[start][0]
+            self.boundaries[session_id] = boundary
+        return boundary
+
+    async def get_summary(self, session_id, dropped):
+        """
+        Returns the rolling summary of the dropped messages. Only messages that
+        were dropped since the last summary are summarized, together with it.
+
+        Every summary request has to fit into the context window itself, so a
+        long run of dropped messages (for example the first time an old session
+        overflows) is summarized in chunks, each one folded into the summary of
+        the previous ones. Messages longer than a chunk are truncated.
+        """
+        summarized_count, summary = self.summaries.get(session_id, (0, ""))
+        if summarized_count == len(dropped):
+            return summary
+        if summarized_count > len(dropped):
+            summarized_count, summary = 0, ""
+
+        chunk_budget = max(
+            self.max_tokens
+            - self.reserve_tokens
+            - self.summary_tokens
+            - estimate_tokens(SUMMARY_PROMPT),
+            1,
+        )
+        chunk = []
+        chunk_tokens = 0
+        for message in dropped[summarized_count:]:
+            line = f"{message['role']}: {message['content']}"
+            line = line[: chunk_budget * CHARACTERS_PER_TOKEN]
+            tokens = estimate_tokens(line)
+            if chunk and chunk_tokens + tokens > chunk_budget:
+                summary = await self.summarize_chunk(summary, chunk)
+                chunk = []
+                chunk_tokens = 0
+            chunk.append(line)
+            chunk_tokens += tokens
+        if chunk:
+            summary = await self.summarize_chunk(summary, chunk)
+        self.summaries[session_id] = (len(dropped), summary)
+        return summary
+
+    async def summarize_chunk(self, summary, transcript):
+        if summary:
+            transcript = [f"Summary so far: {summary}", *transcript]
+        return await self.summarize(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n\n".join(transcript)},
+            ]
+        )
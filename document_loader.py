@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from llama_index.core import SimpleDirectoryReader
+import multiprocessing
+
+MIN_PARALLEL_FILES = 32
+
+
+def load_file(file_path):
+    """
+    Parses a single file into documents. Runs inside the worker processes.
+    """
+    return SimpleDirectoryReader(
+        input_files=[file_path], filename_as_id=True
+    ).load_data()
+
+
+class DocumentLoader:
+    """
+    Parses files into documents, optionally in a pool of worker processes.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(1, workers)
+
+    def iter_documents(self, file_paths):
+        """
+        Yields the documents of each file as soon as it has been parsed.
+
+        With more than one worker, files are parsed in parallel and yielded in
+        completion order. Workers are spawned rather than forked because the
+        parent process runs threads (Textual, LanceDB) that must not be copied.
+        Small batches are parsed in-process, where starting the workers would
+        cost more than it saves.
+        """
+        if self.workers == 1 or len(file_paths) < MIN_PARALLEL_FILES:
+            for file_path in file_paths:
+                yield load_file(file_path)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(file_paths)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            futures = [pool.submit(load_file, file_path) for file_path in file_paths]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llama_index.core.schema import MetadataMode
+import threading
+import time
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_CONCURRENT_REQUESTS = 1
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+
+
+class IngestionProgress:
+    """
+    Counts embedded chunks and reports the embedding throughput. The clock
+    starts with the first chunks to embed, so document parsing is not counted.
+    """
+
+    def __init__(self):
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.started = None
+
+    def start(self):
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def chunks_per_second(self):
+        if self.started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.chunks_done / elapsed
+
+    def __str__(self):
+        return (
+            f"Embedded {self.chunks_done}/{self.chunks_total} chunks "
+            f"({self.chunks_per_second():.1f} chunks/s)"
+        )
+
+
+class EmbeddingBatcher:
+    """
+    Embeds nodes in fixed-size batches with a bounded number of requests in flight.
+
+    Works with any llama_index embedding model, so it can be pointed at a stub
+    server as well as a local Ollama instance.
+    """
+
+    def __init__(
+        self,
+        embed_model,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        retry_backoff=DEFAULT_RETRY_BACKOFF,
+        progress_callback=None,
+    ):
+        self.embed_model = embed_model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.progress_callback = progress_callback
+        self.progress = IngestionProgress()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, embed_model, ingestion_config, progress_callback=None):
+        """
+        Creates a batcher from the `ingestion` section of a RAG app config.
+        """
+        return cls(
+            embed_model,
+            batch_size=ingestion_config.get("embed_batch_size", DEFAULT_BATCH_SIZE),
+            max_concurrent_requests=ingestion_config.get(
+                "max_concurrent_requests", DEFAULT_MAX_CONCURRENT_REQUESTS
+            ),
+            max_retries=ingestion_config.get("max_retries", DEFAULT_MAX_RETRIES),
+            retry_backoff=ingestion_config.get("retry_backoff", DEFAULT_RETRY_BACKOFF),
+            progress_callback=progress_callback,
+        )
+
+    def embed_nodes(self, nodes):
+        """
+        Sets the embedding of every node that does not have one yet.
+        """
+        pending = [node for node in nodes if node.embedding is None]
+        if not pending:
+            return nodes
+        batches = [
+            pending[start : start + self.batch_size]
+            for start in range(0, len(pending), self.batch_size)
+        ]
+        with self.lock:
+            self.progress.start()
+            self.progress.chunks_total += len(pending)
+
+        if self.max_concurrent_requests == 1 or len(batches) == 1:
+            for batch in batches:
+                self.embed_batch(batch)
+            return nodes
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrent_requests, len(batches))
+        ) as pool:
+            for future in as_completed(
+                [pool.submit(self.embed_batch, batch) for batch in batches]
+            ):
+                future.result()
+        return nodes
+
+    def embed_batch(self, batch):
+        """
+        Embeds one batch in a single request, retrying with exponential backoff.
+        """
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                embeddings = self.embed_model.get_text_embedding_batch(texts)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.retry_backoff * 2**attempt)
+
+        for node, embedding in zip(batch, embeddings):
+            node.embedding = embedding
+
+        with self.lock:
+            self.progress.chunks_done += len(batch)
+        if self.progress_callback:
+            self.progress_callback(self.progress)
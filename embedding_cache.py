@@ -0,0 +1,154 @@
+from llama_index.core.storage.kvstore.types import BaseKVStore
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from util import get_app_save_dir, get_setting
+
+DEFAULT_MAX_ENTRIES = 100000
+EVICTION_SLACK = 0.1
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Disk-backed LRU cache of embeddings, keyed by embed model and normalized
+    text.
+
+    The cache is shared by all apps, so a question or chunk is embedded once per
+    embed model, no matter which app or document it comes from. Entries are
+    stored in embedding_cache.db in the app save directory; once the cache holds
+    more than max_entries, the least recently used entries are deleted.
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.path.join(
+            get_app_save_dir("ollama-rag-tui"), "embedding_cache.db"
+        )
+        self.max_entries = max_entries or get_setting(
+            "embedding_cache", "max_entries", DEFAULT_MAX_ENTRIES
+        )
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+        (self.count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()
+
+    @staticmethod
+    def get_key(model_name, text):
+        return hashlib.sha256(
+            f"{model_name}\0{normalize_text(text)}".encode()
+        ).hexdigest()
+
+    def get(self, model_name, text):
+        """
+        Returns the cached embedding of the text, or None.
+        """
+        key = self.get_key(model_name, text)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT embedding FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def put(self, model_name, text, embedding):
+        """
+        Stores the embedding of the text and evicts old entries if the cache is
+        full.
+        """
+        key = self.get_key(model_name, text)
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, np.asarray(embedding, dtype=np.float32).tobytes(), time.time()),
+            )
+            self.count += cursor.rowcount
+            if self.count > self.max_entries * (1 + EVICTION_SLACK):
+                self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries beyond max_entries.
+        """
+        self.connection.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (self.count - self.max_entries,),
+        )
+        (self.count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()
+
+    def for_model(self, model_name):
+        """
+        Returns the cache of one embed model, to be used as embeddings_cache of
+        a llama_index embedding model.
+        """
+        return ModelEmbeddingCache(self, model_name)
+
+
+class ModelEmbeddingCache(BaseKVStore):
+    """
+    Adapts the embedding cache of one embed model to the key-value store
+    interface llama_index uses for embeddings_cache.
+    """
+
+    def __init__(self, cache, model_name):
+        self.cache = cache
+        self.model_name = model_name
+
+    def put(self, key, val, collection=None):
+        self.cache.put(self.model_name, key, next(iter(val.values())))
+
+    async def aput(self, key, val, collection=None):
+        self.put(key, val, collection)
+
+    def get(self, key, collection=None):
+        embedding = self.cache.get(self.model_name, key)
+        if embedding is None:
+            return None
+        return {"embedding": embedding}
+
+    async def aget(self, key, collection=None):
+        return self.get(key, collection)
+
+    def get_all(self, collection=None):
+        return {}
+
+    async def aget_all(self, collection=None):
+        return {}
+
+    def delete(self, key, collection=None):
+        return False
+
+    async def adelete(self, key, collection=None):
+        return False
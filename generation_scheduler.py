@@ -0,0 +1,100 @@
+from contextlib import asynccontextmanager
+import asyncio
+
+from util import get_setting
+
+
+class GenerationScheduler:
+    """
+    Limits how many generations run at once, globally and per model.
+
+    Generations that exceed a limit are queued and started in the order they
+    were requested, skipping queued generations whose model is still at its
+    limit. Every state change ("queued", "running", "done", "cancelled" or
+    "failed") is reported to state_callback with the session id.
+    """
+
+    def __init__(self, max_concurrent=None, max_concurrent_per_model=None):
+        self.max_concurrent = max_concurrent or get_setting(
+            "scheduler", "max_concurrent", 2
+        )
+        self.max_concurrent_per_model = max_concurrent_per_model or get_setting(
+            "scheduler", "max_concurrent_per_model", 1
+        )
+        self.running = 0
+        self.running_per_model = {}
+        self.waiters = []
+        self.states = {}
+        self.state_callback = None
+
+    def get_state(self, session_id):
+        return self.states.get(session_id)
+
+    def is_active(self, session_id):
+        """
+        Checks if a generation for the session is queued or running.
+        """
+        return self.get_state(session_id) in ["queued", "running"]
+
+    def set_state(self, session_id, state):
+        self.states[session_id] = state
+        if self.state_callback:
+            self.state_callback(session_id, state)
+
+    def can_start(self, model):
+        return (
+            self.running < self.max_concurrent
+            and self.running_per_model.get(model, 0) < self.max_concurrent_per_model
+        )
+
+    def dispatch(self):
+        """
+        Starts queued generations while the limits allow it.
+        """
+        for waiter in list(self.waiters):
+            model, future = waiter
+            if self.running >= self.max_concurrent:
+                break
+            if not self.can_start(model):
+                continue
+            self.waiters.remove(waiter)
+            self.running += 1
+            self.running_per_model[model] = self.running_per_model.get(model, 0) + 1
+            future.set_result(None)
+
+    def release(self, model):
+        self.running -= 1
+        self.running_per_model[model] -= 1
+        self.dispatch()
+
+    @asynccontextmanager
+    async def slot(self, model, session_id):
+        """
+        Waits until a generation with the model may run and holds the slot for
+        the duration of the block.
+        """
+        waiter = (model, asyncio.get_running_loop().create_future())
+        self.waiters.append(waiter)
+        self.set_state(session_id, "queued")
+        self.dispatch()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            else:
+                self.release(model)
+            self.set_state(session_id, "cancelled")
+            raise
+
+        self.set_state(session_id, "running")
+        state = "failed"
+        try:
+            yield
+            state = "done"
+        except (asyncio.CancelledError, GeneratorExit):
+            state = "cancelled"
+            raise
+        finally:
+            self.release(model)
+            self.set_state(session_id, state)
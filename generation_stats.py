@@ -0,0 +1,168 @@
+from contextvars import ContextVar
+import os
+import threading
+import time
+
+from util import get_app_save_dir, get_setting, load_data, save_data_atomic
+
+STAT_KEYS = [
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+    "load_duration",
+    "total_duration",
+]
+DEFAULT_LOAD_THRESHOLD = 0.25
+DEFAULT_MAX_DAYS = 90
+
+# the stats dict of the response generated in the current task, filled in by
+# the LLM once the final chunk arrives
+current_stats = ContextVar("current_stats", default=None)
+
+
+def get_chunk_stats(chunk):
+    """
+    Returns the stats of the final chunk of an Ollama response. Durations are
+    in nanoseconds.
+    """
+    return {key: chunk[key] for key in STAT_KEYS if chunk.get(key) is not None}
+
+
+def get_tokens_per_second(count, duration):
+    if not count or not duration:
+        return None
+    return count / (duration / 1e9)
+
+
+def format_stats(stats):
+    """
+    Returns a short summary of the stats of a message.
+    """
+    parts = []
+    tokens_per_second = get_tokens_per_second(
+        stats.get("eval_count"), stats.get("eval_duration")
+    )
+    if tokens_per_second:
+        parts.append(f"{tokens_per_second:.1f} tok/s")
+    if stats.get("prompt_eval_count"):
+        parts.append(
+            f"prompt {stats['prompt_eval_count']} tok "
+            f"{stats.get('prompt_eval_duration', 0) / 1e9:.2f}s"
+        )
+    if stats.get("load_duration", 0) / 1e9 >= DEFAULT_LOAD_THRESHOLD:
+        parts.append(f"load {stats['load_duration'] / 1e9:.1f}s")
+    return " | ".join(parts)
+
+
+class GenerationStats:
+    """
+    Totals of the Ollama generation stats per day, model and app, stored in
+    generation_stats.json in the app save directory.
+
+    A response counts as a model load if Ollama spent more than
+    generation_stats.load_threshold seconds loading the model. Days older than
+    generation_stats.max_days are dropped.
+    """
+
+    FILE_NAME = "generation_stats.json"
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(
+            get_app_save_dir("ollama-rag-tui"), self.FILE_NAME
+        )
+        self.load_threshold = get_setting(
+            "generation_stats", "load_threshold", DEFAULT_LOAD_THRESHOLD
+        )
+        self.max_days = get_setting("generation_stats", "max_days", DEFAULT_MAX_DAYS)
+        self.lock = threading.Lock()
+        self.buckets = None
+
+    def load(self):
+        if self.buckets is None:
+            data = load_data(self.path) or {}
+            self.buckets = {
+                (bucket["day"], bucket["model"], bucket["app"]): bucket
+                for bucket in data.get("buckets", [])
+            }
+
+    def record(self, app_id, model, stats):
+        """
+        Adds the stats of a response to the totals of today and saves them.
+        """
+        if not stats.get("eval_count"):
+            return
+        day = time.strftime("%Y-%m-%d")
+        with self.lock:
+            self.load()
+            bucket = self.buckets.setdefault(
+                (day, model, app_id),
+                {
+                    "day": day,
+                    "model": model,
+                    "app": app_id,
+                    "responses": 0,
+                    "loads": 0,
+                    **{name: 0 for name in STAT_KEYS},
+                },
+            )
+            bucket["responses"] += 1
+            for key in STAT_KEYS:
+                bucket[key] += stats.get(key, 0)
+            if stats.get("load_duration", 0) / 1e9 >= self.load_threshold:
+                bucket["loads"] += 1
+
+            oldest = time.strftime(
+                "%Y-%m-%d", time.localtime(time.time() - self.max_days * 86400)
+            )
+            self.buckets = {
+                key: bucket for key, bucket in self.buckets.items() if key[0] >= oldest
+            }
+            save_data_atomic({"buckets": list(self.buckets.values())}, self.path)
+
+    def get_rows(self, per_day=True):
+        """
+        Returns the totals per day, model and app (or per model and app over all
+        days) with the derived rates, newest day first.
+        """
+        with self.lock:
+            self.load()
+            buckets = list(self.buckets.values())
+
+        totals = {}
+        for bucket in buckets:
+            key = (bucket["day"] if per_day else None, bucket["model"], bucket["app"])
+            total = totals.setdefault(
+                key,
+                {
+                    "day": key[0],
+                    "model": bucket["model"],
+                    "app": bucket["app"],
+                    "responses": 0,
+                    "loads": 0,
+                    **{name: 0 for name in STAT_KEYS},
+                },
+            )
+            for name in ["responses", "loads", *STAT_KEYS]:
+                total[name] += bucket[name]
+
+        rows = []
+        for key in sorted(totals, key=lambda key: (key[0] or "", key[1], key[2])):
+            total = totals[key]
+            rows.append(
+                {
+                    **total,
+                    "tokens_per_second": get_tokens_per_second(
+                        total["eval_count"], total["eval_duration"]
+                    ),
+                    "prompt_tokens_per_second": get_tokens_per_second(
+                        total["prompt_eval_count"], total["prompt_eval_duration"]
+                    ),
+                    "prompt_eval_seconds": total["prompt_eval_duration"]
+                    / 1e9
+                    / total["responses"],
+                    "load_rate": total["loads"] / total["responses"],
+                }
+            )
+        rows.sort(key=lambda row: row["day"] or "", reverse=True)
+        return rows
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from lancedb.index import FTS
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from vector_index import get_table
+
+DEFAULT_RRF_K = 60
+DEFAULT_REBUILD_RATIO = 0.2
+TEXT_COLUMN = "text"
+
+
+def get_keyword_index(table):
+    return next(
+        (index for index in table.list_indices() if index.index_type == "FTS"), None
+    )
+
+
+def has_keyword_index(table):
+    return get_keyword_index(table) is not None
+
+
+def needs_keyword_index(table, config):
+    """
+    Checks if the table has no full-text index yet or too many rows were added
+    since it was built. Rows added after the index was built are still found,
+    but by a flat search, and deleted rows are left out of the results.
+    """
+    index = get_keyword_index(table)
+    if index is None:
+        return True
+    rebuild_ratio = config.get("rebuild_ratio", DEFAULT_REBUILD_RATIO)
+    return index.num_unindexed_rows > table.count_rows() * rebuild_ratio
+
+
+def create_keyword_index(table):
+    """
+    Builds the full-text (BM25) index over the chunk texts of a LanceDB table.
+    """
+    table.create_index(TEXT_COLUMN, config=FTS(), replace=True)
+
+
+def reciprocal_rank_fusion(rankings, weights, rrf_k=DEFAULT_RRF_K):
+    """
+    Merges ranked lists of nodes. Every node scores weight / (rrf_k + rank) for
+    each list it appears in; the sums are returned in descending order.
+    """
+    scores = {}
+    nodes = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, node in enumerate(ranking, start=1):
+            node_id = node.node.node_id
+            scores[node_id] = scores.get(node_id, 0.0) + weight / (rrf_k + rank)
+            nodes.setdefault(node_id, node.node)
+    return [
+        NodeWithScore(node=nodes[node_id], score=score)
+        for node_id, score in sorted(
+            scores.items(), key=lambda item: item[1], reverse=True
+        )
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks by vector similarity and by BM25 full-text search in
+    parallel and merges both rankings with reciprocal-rank fusion.
+
+    Full-text search finds exact identifiers, error messages and API names that
+    dense embeddings tend to miss.
+    """
+
+    def __init__(self, index, vector_store, top_k, config):
+        super().__init__()
+        self.vector_store = vector_store
+        self.top_k = top_k
+        self.keyword_top_k = config.get("keyword_top_k", top_k)
+        self.vector_weight = config.get("vector_weight", 1.0)
+        self.keyword_weight = config.get("keyword_weight", 1.0)
+        self.rrf_k = config.get("rrf_k", DEFAULT_RRF_K)
+        self.vector_retriever = index.as_retriever(
+            similarity_top_k=config.get("vector_top_k", top_k)
+        )
+        self.keyword_index_ready = False
+        # one pool per retriever, so answers of other apps never wait for it;
+        # its threads are only started by the first search
+        self.executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="vector-search"
+        )
+
+    def _retrieve(self, query_bundle):
+        vector_future = self.executor.submit(
+            self.vector_retriever.retrieve, query_bundle
+        )
+        keyword_nodes = self.keyword_search(query_bundle.query_str)
+        fused = reciprocal_rank_fusion(
+            [vector_future.result(), keyword_nodes],
+            [self.vector_weight, self.keyword_weight],
+            self.rrf_k,
+        )
+        return fused[: self.top_k]
+
+    def keyword_search(self, query):
+        """
+        Returns the chunks ranked by BM25, or nothing if the store has no
+        full-text index yet.
+        """
+        table = get_table(self.vector_store)
+        if table is None:
+            return []
+        if not self.keyword_index_ready:
+            self.keyword_index_ready = has_keyword_index(table)
+            if not self.keyword_index_ready:
+                return []
+        results = (
+            table.search(query, query_type="fts").limit(self.keyword_top_k).to_pandas()
+        )
+        return [
+            NodeWithScore(
+                node=metadata_dict_to_node(row["metadata"], text=row[TEXT_COLUMN]),
+                score=row["_score"],
+            )
+            for _, row in results.iterrows()
+        ]
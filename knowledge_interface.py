@@ -1,14 +1,15 @@
-from ollama import AsyncClient
-from llama_index.core import (
-    VectorStoreIndex,
-    SimpleDirectoryReader,
-    Settings,
-    StorageContext,
-)
-from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.llms.ollama import Ollama
-from llama_index.vector_stores.lancedb import LanceDBVectorStore
-import os
+from contextlib import aclosing
+import asyncio
+import threading
+import time
+
+from context_window import ContextWindow
+from generation_scheduler import GenerationScheduler
+from generation_stats import GenerationStats, get_chunk_stats
+from ollama_client import OllamaClients
+from rag_engine_cache import RagEngineCache
+from tracing import Tracer, get_trace
+from util import get_setting
 
 
 class KnowledgeInterface:
@@ -18,78 +19,175 @@ class KnowledgeInterface:
 
     def __init__(self, chat_app):
         self.chat_app = chat_app
-        self.index = None
+        self.engine_cache = RagEngineCache()
+        self.engine_lock = threading.Lock()
+        self.progress_callback = None
+        self.context_windows = {}
+        self.ollama = OllamaClients()
+        self.scheduler = GenerationScheduler()
+        self.tracer = Tracer()
+        self.generation_stats = GenerationStats()
+        self.embedding_cache = None
 
-    async def generate_response_stream(self, session):
+    async def generate_response_stream(self, session, response_info=None):
         """
-        Generates a streaming response for the given session.
+        Generates a streaming response for the given session once the scheduler
+        has a free slot for the app's model.
+
+        Details about the response are added to the response_info dict:
+        "cached" if it came from the answer cache, and "stats" with the model
+        and the Ollama generation stats, which are also added to the totals in
+        generation_stats. Its "trace" holds the timed
+        spans of the response; the caller adds its own spans and records it
+        with tracer.record. Failed responses are recorded right away.
         """
+        if self.chat_app.reload_chat_apps_if_changed():
+            # setup_rag may be building an engine in a worker thread, so wait
+            # for the lock off the event loop
+            await asyncio.to_thread(self.clear_caches)
         app = self.chat_app.get_chat_app_by_id(session["app"])
+        trace = self.tracer.start(app["id"], app["model"], session["id"])
+        if response_info is None:
+            response_info = {}
+        response_info["trace"] = trace
+
+        status = "failed"
+        try:
+            queued = time.perf_counter()
+            async with self.scheduler.slot(app["model"], session["id"]):
+                trace.add_span("queue", queued, time.perf_counter())
+                async with aclosing(
+                    self.stream_response(app, session, response_info)
+                ) as stream:
+                    async for text in stream:
+                        trace.add_chunk()
+                        yield text
+            status = "done"
+            if response_info.get("stats"):
+                response_info["stats"]["model"] = app["model"]
+                await asyncio.to_thread(
+                    self.generation_stats.record,
+                    app["id"],
+                    app["model"],
+                    response_info["stats"],
+                )
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            trace.cached = response_info.get("cached", False)
+            trace.finish_generation(status)
+            if status == "failed":
+                self.tracer.record(trace)
 
+    async def stream_response(self, app, session, response_info=None):
+        """
+        Streams the answer of the app to the last message of the session.
+
+        Closing the stream closes the HTTP response, so Ollama stops generating
+        when a response is cancelled.
+        """
+        trace = get_trace(response_info)
         if app["chat_app_type"]["name"] == "chat":
+            with trace.span("context"):
+                messages = await self.get_context_window(app).build_messages(session)
             cleared_messaged = [
-                {k: v for k, v in message.items() if k not in ["id", "timestamp"]}
-                for message in session["messages"]
+                {
+                    k: v
+                    for k, v in message.items()
+                    if k not in ["id", "timestamp", "cached", "stats"]
+                }
+                for message in messages
             ]
 
-            async for chunk in await AsyncClient().chat(
-                model=app["model"], messages=cleared_messaged, stream=True
-            ):
-                yield chunk["message"]["content"]
+            options = {}
+            if "max_tokens" in app["chat_app_type"].get("context", {}):
+                options["num_ctx"] = app["chat_app_type"]["context"]["max_tokens"]
+            response = await self.ollama.async_client.chat(
+                model=app["model"],
+                messages=cleared_messaged,
+                stream=True,
+                options=options or None,
+                keep_alive=self.ollama.keep_alive,
+            )
+            async with aclosing(response):
+                async for chunk in response:
+                    if chunk["done"] and response_info is not None:
+                        response_info["stats"] = get_chunk_stats(chunk)
+                    yield chunk["message"]["content"]
 
         elif app["chat_app_type"]["name"] == "rag":
-            self.setup_rag(app)
-            query_engine = self.index.as_query_engine(
-                streaming=True, similarity_top_k=3
-            )
+            with trace.span("setup"):
+                engine = await asyncio.to_thread(self.setup_rag, app)
+            query = session["messages"][-1]["content"]
+            async with aclosing(engine.astream_query(query, response_info)) as stream:
+                async for text in stream:
+                    yield text
+
+    def get_context_window(self, chat_app):
+        """
+        Returns the context window of the app, which caches token counts and
+        summaries across turns.
+        """
+        if chat_app["id"] not in self.context_windows:
 
-            streaming_response = query_engine.query(session["messages"][-1]["content"])
+            async def summarize(messages):
+                response = await self.ollama.async_client.chat(
+                    model=chat_app["model"],
+                    messages=messages,
+                    keep_alive=self.ollama.keep_alive,
+                )
+                return response["message"]["content"]
 
-            for text in streaming_response.response_gen:
-                yield text
+            self.context_windows[chat_app["id"]] = ContextWindow(chat_app, summarize)
+        return self.context_windows[chat_app["id"]]
 
     def setup_rag(self, chat_app):
         """
-        Sets up the Retrieval-Augmented Generation (RAG) index.
+        Returns the cached Retrieval-Augmented Generation (RAG) engine for the app,
+        building it on first use. Safe to call from worker threads.
         """
-        model = chat_app["model"]
-
-        embed_model = OllamaEmbedding(
-            model_name=chat_app["chat_app_type"]["embed_model"],
-            base_url="http://localhost:11434",
-            ollama_additional_kwargs={"mirostat": 0},
-        )
-        Settings.embed_model = embed_model
-
-        index = None
-        vector_store_path = chat_app["chat_app_type"]["vector_store_path"]
-        if not os.path.exists(vector_store_path):
-            documents = SimpleDirectoryReader(
-                input_dir=chat_app["chat_app_type"]["input_dir"],
-                recursive=True,
-                required_exts=[
-                    ".csv",
-                    ".docx",
-                    ".epub",
-                    ".ipynb",
-                    ".md",
-                    ".pdf",
-                    ".ppt",
-                    ".pptm",
-                    ".pptx",
-                    ".mbox",
-                ],
-            ).load_data()
-            vector_store = LanceDBVectorStore(uri=vector_store_path)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
-            index = VectorStoreIndex.from_documents(
-                documents, storage_context=storage_context
+        # llama_index and LanceDB take seconds to import, so they are only
+        # imported once a RAG app is used (or by warm_up)
+        from rag_engine import RagEngine
+
+        with self.engine_lock:
+            if self.embedding_cache is None and get_setting(
+                "embedding_cache", "enabled", True
+            ):
+                from embedding_cache import EmbeddingCache
+
+                self.embedding_cache = EmbeddingCache()
+            return self.engine_cache.get_or_create(
+                RagEngine.get_cache_key(chat_app),
+                lambda: RagEngine(
+                    chat_app, self.progress_callback, self.ollama, self.embedding_cache
+                ),
             )
 
-        else:
-            vector_store = LanceDBVectorStore(uri=vector_store_path)
-            index = VectorStoreIndex.from_vector_store(vector_store)
+    def warm_up(self):
+        """
+        Imports the RAG stack and the Ollama client library, so the first
+        question does not wait for them. Meant to run in a worker thread after
+        the UI is shown.
+        """
+        import rag_engine  # noqa: F401
+
+        self.ollama.create_clients()
 
-        llm = Ollama(model=model, request_timeout=999.0)
-        Settings.llm = llm
-        self.index = index
+    def clear_caches(self):
+        """
+        Drops the cached engines and context windows of all apps, for example
+        after apps.json changed.
+        """
+        with self.engine_lock:
+            self.engine_cache.clear()
+            self.context_windows.clear()
+
+    def reindex_app(self, app_id):
+        """
+        Drops the cached engines of the app so that the next question syncs the
+        input directory into the vector store again.
+        """
+        with self.engine_lock:
+            self.engine_cache.invalidate_app(app_id)
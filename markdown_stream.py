@@ -0,0 +1,53 @@
+import time
+
+from util import get_setting
+
+
+class MarkdownStreamRenderer:
+    """
+    Streams response tokens into a Markdown widget at a bounded frame rate.
+
+    Tokens are collected in a list buffer and rendered at most once per frame.
+    Each render appends only the new text, so the widget re-parses just the
+    trailing block instead of the whole document.
+    """
+
+    def __init__(self, markdown, on_render=None, fps=None):
+        self.markdown = markdown
+        self.on_render = on_render
+        self.frame_interval = 1 / (fps or get_setting("rendering", "stream_fps", 20))
+        self.chunks = []
+        self.pending = []
+        self.rendered_any = False
+        self.last_render = 0.0
+
+    async def write(self, chunk):
+        """
+        Buffers a chunk and renders if the current frame is due.
+        """
+        self.chunks.append(chunk)
+        self.pending.append(chunk)
+        if time.monotonic() - self.last_render >= self.frame_interval:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Renders all buffered chunks.
+        """
+        text = "".join(self.pending)
+        if not self.rendered_any:
+            text = text.lstrip()
+        if not text:
+            return
+        self.pending.clear()
+        self.rendered_any = True
+        await self.markdown.append(text)
+        self.last_render = time.monotonic()
+        if self.on_render:
+            self.on_render()
+
+    def get_content(self):
+        """
+        Returns the full streamed text.
+        """
+        return "".join(self.chunks)
@@ -0,0 +1,104 @@
+import os
+
+from util import get_setting
+
+DEFAULT_HOST = "http://localhost:11434"
+
+
+class OllamaClients:
+    """
+    The Ollama clients shared by all chat and RAG requests.
+
+    Both clients keep a pool of HTTP connections alive between requests, so a
+    chat turn or an embedding batch does not set up a new connection. Host,
+    timeouts and pool limits are read from the "ollama" section of the settings.
+
+    The ollama and llama_index packages are imported when the first client or
+    model is created, which keeps them out of the startup time.
+    """
+
+    def __init__(self):
+        self.host = get_setting(
+            "ollama", "host", os.environ.get("OLLAMA_HOST", DEFAULT_HOST)
+        )
+        self.timeout = get_setting("ollama", "timeout", 300.0)
+        self.connect_timeout = get_setting("ollama", "connect_timeout", 10.0)
+        self.keep_alive = get_setting("ollama", "keep_alive")
+        self.max_connections = get_setting("ollama", "max_connections", 10)
+        self.max_keepalive_connections = get_setting(
+            "ollama", "max_keepalive_connections", 10
+        )
+        self.keepalive_expiry = get_setting("ollama", "keepalive_expiry", 300.0)
+        self._client = None
+        self._async_client = None
+
+    def get_client_kwargs(self):
+        import httpx
+
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        }
+
+    def create_clients(self):
+        """
+        Creates both clients. Creating the async client does not bind it to an
+        event loop yet, so this may run in a worker thread.
+        """
+        return self.client, self.async_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from ollama import Client
+
+            self._client = Client(host=self.host, **self.get_client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self):
+        """
+        The async client, bound to the event loop of the app.
+        """
+        if self._async_client is None:
+            from ollama import AsyncClient
+
+            self._async_client = AsyncClient(host=self.host, **self.get_client_kwargs())
+        return self._async_client
+
+    def create_llm(self, model):
+        """
+        Creates a llama_index LLM that sends its requests through the shared
+        clients.
+        """
+        from ollama_llm import StatsOllama
+
+        return StatsOllama(
+            model=model,
+            base_url=self.host,
+            request_timeout=self.timeout,
+            keep_alive=self.keep_alive,
+            client=self.client,
+            async_client=self.async_client,
+        )
+
+    def create_embed_model(self, model_name, **kwargs):
+        """
+        Creates a llama_index embedding model that sends its requests through
+        the shared clients.
+        """
+        from llama_index.embeddings.ollama import OllamaEmbedding
+
+        embed_model = OllamaEmbedding(
+            model_name=model_name,
+            base_url=self.host,
+            keep_alive=self.keep_alive,
+            **kwargs,
+        )
+        embed_model._client = self.client
+        embed_model._async_client = self.async_client
+        return embed_model
@@ -0,0 +1,25 @@
+from contextlib import aclosing
+from llama_index.llms.ollama import Ollama
+
+from generation_stats import current_stats, get_chunk_stats
+
+
+class StatsOllama(Ollama):
+    """
+    An Ollama LLM that reports the stats of the final chunk of a streamed chat
+    to current_stats, since the llama_index response synthesizers only pass on
+    the text.
+    """
+
+    async def astream_chat(self, messages, **kwargs):
+        stream = await super().astream_chat(messages, **kwargs)
+
+        async def gen():
+            async with aclosing(stream):
+                async for response in stream:
+                    stats = current_stats.get()
+                    if stats is not None and (response.raw or {}).get("done"):
+                        stats.update(get_chunk_stats(response.raw))
+                    yield response
+
+        return gen()
@@ -0,0 +1,78 @@
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Button, DataTable, Label
+
+from generation_stats import GenerationStats
+
+COLUMNS = [
+    "Day",
+    "Model",
+    "App",
+    "Responses",
+    "Tokens/s",
+    "Prompt tokens/s",
+    "Prompt eval (s)",
+    "Model loads",
+]
+
+
+def format_rate(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+class PerformanceScreen(ModalScreen):
+    """
+    A modal screen showing the generation speed, prompt evaluation cost and
+    model load frequency per model and app, in total and per day.
+    """
+
+    BINDINGS = [Binding("escape", "close", "Close", show=True)]
+
+    def __init__(self, generation_stats: GenerationStats, **kw):
+        super().__init__(**kw)
+        self.generation_stats = generation_stats
+
+    def compose(self) -> ComposeResult:
+        """
+        Composes the user interface for the performance screen.
+        """
+        with Vertical(id="performance-dialog"):
+            yield Label("Performance per model and app")
+            yield DataTable(id="performance-totals", cursor_type="row")
+            yield Label("Performance per day")
+            yield DataTable(id="performance-days", cursor_type="row")
+            yield Button("Close", variant="error", id="performance-close")
+
+    def on_mount(self) -> None:
+        """
+        Fills the tables with the stored generation stats.
+        """
+        for table_id, per_day in [
+            ("#performance-totals", False),
+            ("#performance-days", True),
+        ]:
+            table = self.query_one(table_id, DataTable)
+            table.add_columns(*(COLUMNS if per_day else COLUMNS[1:]))
+            for row in self.generation_stats.get_rows(per_day):
+                cells = [
+                    row["model"],
+                    row["app"],
+                    row["responses"],
+                    format_rate(row["tokens_per_second"]),
+                    format_rate(row["prompt_tokens_per_second"]),
+                    f"{row['prompt_eval_seconds']:.2f}",
+                    f"{row['loads']} ({row['load_rate']:.0%})",
+                ]
+                table.add_row(*([row["day"], *cells] if per_day else cells))
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        """
+        Handles button press events for the performance screen.
+        """
+        if event.button.id == "performance-close":
+            self.dismiss(None)
+
+    def action_close(self):
+        self.dismiss(None)
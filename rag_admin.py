@@ -0,0 +1,75 @@
+import argparse
+import sys
+import time
+
+from chat_app_manager import ChatAppManager
+from embedding_cache import EmbeddingCache
+from rag_engine import RagEngine
+from util import get_setting
+
+
+def load_rag_app(app_id):
+    chat_app = ChatAppManager().get_chat_app_by_id(app_id)
+    if chat_app is None or chat_app["chat_app_type"]["name"] != "rag":
+        sys.exit(f"No RAG app with id {app_id!r} in apps.json")
+    return chat_app
+
+
+def create_engine(app_id):
+    """
+    Builds the RAG engine of the app with the embedding cache the TUI uses, so
+    chunks embedded by either are not embedded again.
+    """
+    embedding_cache = None
+    if get_setting("embedding_cache", "enabled", True):
+        embedding_cache = EmbeddingCache()
+    return RagEngine(load_rag_app(app_id), embedding_cache=embedding_cache)
+
+
+def sync(args):
+    """
+    Syncs the input directory of the app into its vector store. The search
+    indexes are built or refreshed as needed.
+    """
+    start = time.perf_counter()
+    engine = create_engine(args.app_id)
+    print(f"Synced {args.app_id}: {engine.ingestion_plan}")
+    print(f"Took {time.perf_counter() - start:.1f}s")
+
+
+def build_index(args):
+    """
+    Syncs the app and rebuilds its ANN and full-text indexes, regardless of the
+    store size. Run this after large ingests.
+    """
+    start = time.perf_counter()
+    engine = create_engine(args.app_id)
+    print(f"Synced {args.app_id}: {engine.ingestion_plan}")
+    if not engine.ingestor.has_vectors():
+        sys.exit("The vector store is empty, nothing to index")
+    engine.ingestor.build_indexes(rebuild_keyword_index=True, rebuild_vector_index=True)
+    table = engine.vector_store.table
+    for index in table.list_indices():
+        print(f"Built {index.index_type} index on {', '.join(index.columns)}")
+    print(f"Took {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintains the vector stores of RAG apps."
+    )
+    commands = parser.add_subparsers(required=True)
+    sync_parser = commands.add_parser("sync", help=sync.__doc__.strip())
+    sync_parser.add_argument("app_id")
+    sync_parser.set_defaults(func=sync)
+    build_index_parser = commands.add_parser(
+        "build-index", help=build_index.__doc__.strip()
+    )
+    build_index_parser.add_argument("app_id")
+    build_index_parser.set_defaults(func=build_index)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
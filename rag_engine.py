@@ -0,0 +1,193 @@
+from contextlib import aclosing
+from llama_index.core import QueryBundle, VectorStoreIndex
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.vector_stores.lancedb import LanceDBVectorStore
+import asyncio
+import json
+
+from answer_cache import AnswerCache
+from embedding_batcher import DEFAULT_BATCH_SIZE
+from generation_stats import current_stats
+from hybrid_retriever import HybridRetriever
+from ollama_client import OllamaClients
+from rag_ingestion import RagIngestor
+from reranker import Reranker
+from tracing import get_trace
+from util import get_directory_size
+from vector_index import DEFAULT_NPROBES
+
+DEFAULT_TOP_K = 3
+
+
+class RagEngine:
+    """
+    Holds the embedding model, index, LLM and query engine built for a RAG chat app.
+    """
+
+    def __init__(
+        self, chat_app, progress_callback=None, ollama=None, embedding_cache=None
+    ):
+        rag_config = chat_app["chat_app_type"]
+        ingestion_config = rag_config.get("ingestion", {})
+        self.app_id = chat_app["id"]
+        self.vector_store_path = rag_config["vector_store_path"]
+
+        ollama = ollama or OllamaClients()
+        self.embed_model = ollama.create_embed_model(
+            rag_config["embed_model"],
+            ollama_additional_kwargs={"mirostat": 0},
+            embed_batch_size=ingestion_config.get(
+                "embed_batch_size", DEFAULT_BATCH_SIZE
+            ),
+            embeddings_cache=(
+                embedding_cache.for_model(rag_config["embed_model"])
+                if embedding_cache
+                else None
+            ),
+        )
+        self.llm = ollama.create_llm(chat_app["model"])
+        self.index = self.load_index(chat_app, progress_callback)
+        top_k = rag_config.get("top_k", DEFAULT_TOP_K)
+        self.reranker = None
+        rerank_config = rag_config.get("rerank")
+        if rerank_config:
+            self.reranker = Reranker(top_k, rerank_config)
+            top_k = rerank_config.get("candidates", top_k)
+        hybrid_config = rag_config.get("hybrid", {})
+        if hybrid_config.get("enabled", False):
+            self.query_engine = RetrieverQueryEngine.from_args(
+                HybridRetriever(self.index, self.vector_store, top_k, hybrid_config),
+                llm=self.llm,
+                streaming=True,
+            )
+        else:
+            self.query_engine = self.index.as_query_engine(
+                llm=self.llm, streaming=True, similarity_top_k=top_k
+            )
+        self.answer_cache = None
+        answer_cache_config = rag_config.get("answer_cache", {})
+        if answer_cache_config.get("enabled", False):
+            self.answer_cache = AnswerCache(
+                self.vector_store_path,
+                self.get_answer_cache_version(chat_app),
+                answer_cache_config,
+            )
+
+    @staticmethod
+    def get_cache_key(chat_app):
+        """
+        Returns the key identifying an engine built for the given app config.
+        """
+        rag_config = chat_app["chat_app_type"]
+        return (
+            chat_app["id"],
+            chat_app["model"],
+            rag_config["embed_model"],
+            rag_config["vector_store_path"],
+            rag_config.get("top_k", DEFAULT_TOP_K),
+            json.dumps(rag_config.get("hybrid", {}), sort_keys=True),
+            json.dumps(rag_config.get("rerank", {}), sort_keys=True),
+            json.dumps(rag_config.get("vector_index", {}), sort_keys=True),
+        )
+
+    def get_answer_cache_version(self, chat_app):
+        """
+        Returns the version cached answers belong to: the ingested documents
+        plus the settings that change answers.
+        """
+        return "/".join(
+            str(part)
+            for part in [self.index_version, *RagEngine.get_cache_key(chat_app)]
+        )
+
+    def load_index(self, chat_app, progress_callback=None):
+        """
+        Opens the vector store and syncs the input directory into it.
+        """
+        vector_index_config = chat_app["chat_app_type"].get("vector_index", {})
+        self.vector_store = LanceDBVectorStore(
+            uri=self.vector_store_path,
+            nprobes=vector_index_config.get("nprobes", DEFAULT_NPROBES),
+            refine_factor=vector_index_config.get("refine_factor"),
+        )
+        index = VectorStoreIndex.from_vector_store(
+            self.vector_store, embed_model=self.embed_model
+        )
+        self.ingestor = RagIngestor(
+            chat_app, index, self.vector_store, self.embed_model, progress_callback
+        )
+        self.ingestion_plan = self.ingestor.run()
+        self.index_version = self.ingestor.manifest.get_version()
+        self.ingestion_progress = self.ingestor.batcher.progress
+        return index
+
+    async def astream_query(self, query, response_info=None):
+        """
+        Streams the answer to the query without blocking the event loop.
+
+        LanceDB only offers a synchronous search, so retrieval runs in a worker
+        thread. The answer is then streamed through the LLM's async client; the
+        stream is closed when the caller stops iterating, which ends the
+        generation in Ollama.
+
+        The Ollama stats of the generation are added to response_info["stats"].
+        With the answer cache enabled, a cached answer is returned at once and
+        response_info["cached"] is set. The query is embedded once, and the
+        embedding is used for both the cache lookup and retrieval.
+        """
+        trace = get_trace(response_info)
+        embedding = None
+        if self.answer_cache:
+            answer = self.answer_cache.lookup_exact(query)
+            if answer is None:
+                with trace.span("embed"):
+                    embedding = await self.embed_model.aget_query_embedding(query)
+                answer = self.answer_cache.lookup_similar(embedding)
+            if answer is not None:
+                if response_info is not None:
+                    response_info["cached"] = True
+                yield answer
+                return
+
+        if embedding is None:
+            with trace.span("embed"):
+                embedding = await self.embed_model.aget_query_embedding(query)
+        query_bundle = QueryBundle(query, embedding=embedding)
+        with trace.span("retrieve"):
+            nodes = await asyncio.to_thread(self.retrieve, query_bundle)
+        with trace.span("synthesize"):
+            streaming_response = await self.query_engine.asynthesize(
+                query_bundle, nodes
+            )
+        stats = {}
+        current_stats.set(stats)
+        chunks = []
+        async with aclosing(streaming_response.response_gen):
+            async for text in streaming_response.async_response_gen():
+                chunks.append(text)
+                yield text
+        if response_info is not None:
+            response_info["stats"] = stats
+
+        if self.answer_cache:
+            await asyncio.to_thread(
+                self.answer_cache.store, query, embedding, "".join(chunks)
+            )
+
+    def retrieve(self, query_bundle):
+        """
+        Retrieves the chunks for the query. With reranking, the over-fetched
+        candidates are reduced to the best top_k within the token budget.
+        """
+        nodes = self.query_engine.retrieve(query_bundle)
+        if self.reranker:
+            nodes = self.reranker.rerank(query_bundle.query_str, nodes)
+        return nodes
+
+    def estimate_size(self):
+        """
+        Returns the approximate memory footprint of the engine in bytes.
+
+        LanceDB memory-maps the store, so its size on disk is used as the estimate.
+        """
+        return get_directory_size(self.vector_store_path)
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+from util import get_setting
+
+
+class RagEngineCache:
+    """
+    LRU cache of built RAG engines, bounded by entry count and estimated memory.
+    """
+
+    def __init__(self, max_entries=None, max_memory_mb=None):
+        self.max_entries = max_entries or get_setting(
+            "rag_engine_cache", "max_entries", 4
+        )
+        self.max_memory = (
+            (max_memory_mb or get_setting("rag_engine_cache", "max_memory_mb", 2048))
+            * 1024
+            * 1024
+        )
+        self.entries = OrderedDict()
+        self.sizes = {}
+
+    def get(self, key):
+        """
+        Returns the cached engine for the key and marks it as recently used.
+        """
+        engine = self.entries.get(key)
+        if engine is not None:
+            self.entries.move_to_end(key)
+        return engine
+
+    def put(self, key, engine):
+        """
+        Stores an engine and evicts the least recently used ones over the limits.
+        """
+        self.entries[key] = engine
+        self.entries.move_to_end(key)
+        self.sizes[key] = engine.estimate_size()
+        self.evict()
+
+    def get_or_create(self, key, factory):
+        """
+        Returns the cached engine for the key, building it with factory on a miss.
+        """
+        engine = self.get(key)
+        if engine is None:
+            engine = factory()
+            self.put(key, engine)
+        return engine
+
+    def evict(self):
+        """
+        Drops least recently used engines until the cache is within its limits.
+
+        The most recent engine is always kept, even if it exceeds the memory cap.
+        """
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_entries
+            or sum(self.sizes.values()) > self.max_memory
+        ):
+            key, _ = self.entries.popitem(last=False)
+            del self.sizes[key]
+
+    def invalidate_app(self, app_id):
+        """
+        Drops all engines built for the given app id.
+        """
+        for key in [key for key in self.entries if key[0] == app_id]:
+            del self.entries[key]
+            del self.sizes[key]
+
+    def clear(self):
+        """
+        Drops all cached engines.
+        """
+        self.entries.clear()
+        self.sizes.clear()
@@ -0,0 +1,251 @@
+from llama_index.core.node_parser import SentenceSplitter
+from pathlib import Path
+import hashlib
+import os
+
+from document_loader import DocumentLoader
+from embedding_batcher import EmbeddingBatcher
+from hybrid_retriever import create_keyword_index, needs_keyword_index
+from util import load_data, save_data
+from vector_index import create_vector_index, get_table, needs_vector_index
+
+SUPPORTED_EXTENSIONS = [
+    ".csv",
+    ".docx",
+    ".epub",
+    ".ipynb",
+    ".md",
+    ".pdf",
+    ".ppt",
+    ".pptm",
+    ".pptx",
+    ".mbox",
+]
+DELETE_BATCH_SIZE = 500
+
+
+def hash_file(file_path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def quote_filter_value(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+class IngestionManifest:
+    """
+    Records the size, mtime and content hash of every ingested document.
+
+    The manifest lives inside the LanceDB directory, so deleting the store also
+    resets it.
+    """
+
+    FILE_NAME = "ingestion_manifest.json"
+
+    def __init__(self, vector_store_path):
+        self.path = os.path.join(vector_store_path, self.FILE_NAME)
+        data = load_data(self.path) or {}
+        self.files = data.get("files", {})
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self):
+        save_data({"files": self.files}, self.path)
+
+    def get_version(self):
+        """
+        Returns a fingerprint of the ingested documents that changes whenever a
+        document is added, changed or removed.
+        """
+        digest = hashlib.sha256()
+        for file_path, entry in sorted(self.files.items()):
+            digest.update(f"{file_path}\0{entry['hash']}\0".encode())
+        return digest.hexdigest()
+
+
+class IngestionPlan:
+    """
+    The files to embed and the files whose vectors must be deleted.
+    """
+
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.entries = {}
+
+    def has_changes(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __str__(self):
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed"
+        )
+
+
+class RagIngestor:
+    """
+    Incrementally syncs a RAG app's input directory into its vector store.
+    """
+
+    def __init__(
+        self, chat_app, index, vector_store, embed_model, progress_callback=None
+    ):
+        rag_config = chat_app["chat_app_type"]
+        self.input_dir = rag_config["input_dir"]
+        self.index = index
+        self.vector_store = vector_store
+        self.manifest = IngestionManifest(rag_config["vector_store_path"])
+        self.hybrid_config = rag_config.get("hybrid", {})
+        self.vector_index_config = rag_config.get("vector_index", {})
+        ingestion_config = rag_config.get("ingestion", {})
+        self.loader = DocumentLoader(ingestion_config.get("workers", 1))
+        self.batcher = EmbeddingBatcher.from_config(
+            embed_model, ingestion_config, progress_callback
+        )
+
+    def scan_input_dir(self):
+        """
+        Returns the supported, non-hidden files below the input directory.
+
+        A missing input directory (for example an unmounted drive) is an error
+        rather than an empty one, which would delete all vectors.
+        """
+        if not os.path.isdir(self.input_dir):
+            raise FileNotFoundError(f"Input directory {self.input_dir} does not exist")
+        files = []
+        for root, dirs, names in os.walk(self.input_dir):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in names:
+                if name.startswith("."):
+                    continue
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    files.append(str(Path(root) / name))
+        return sorted(files)
+
+    def plan(self, adopt_existing=False):
+        """
+        Compares the input directory with the manifest.
+
+        Size and mtime are checked first; the content hash is only computed when
+        they differ, so unchanged files are never read. With adopt_existing, all
+        files are recorded as ingested without being embedded.
+        """
+        plan = IngestionPlan()
+        for file_path in self.scan_input_dir():
+            stat = os.stat(file_path)
+            known = self.manifest.files.get(file_path)
+            if (
+                known
+                and known["size"] == stat.st_size
+                and known["mtime"] == stat.st_mtime
+            ):
+                plan.entries[file_path] = known
+                continue
+
+            entry = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": hash_file(file_path),
+            }
+            plan.entries[file_path] = entry
+            if adopt_existing or (known and known["hash"] == entry["hash"]):
+                continue
+            if known:
+                plan.changed.append(file_path)
+            else:
+                plan.added.append(file_path)
+
+        plan.removed = [
+            file_path
+            for file_path in self.manifest.files
+            if file_path not in plan.entries
+        ]
+        return plan
+
+    def run(self):
+        """
+        Embeds added and changed files and deletes vectors of changed and removed
+        files, then updates the search indexes. Returns the executed plan.
+
+        Stores created before the manifest existed are adopted as they are
+        instead of being re-embedded.
+
+        The manifest is only updated once all files are embedded. Vectors of
+        added files are deleted too, so files that were partly inserted by an
+        interrupted run are not duplicated when they are embedded again.
+        """
+        adopt_existing = not self.manifest.exists() and self.has_vectors()
+        plan = self.plan(adopt_existing=adopt_existing)
+        if not self.manifest.exists():
+            # an interrupted first run must not be adopted as complete
+            self.manifest.save()
+
+        self.delete_file_vectors(plan.added + plan.changed + plan.removed)
+        self.embed_files(plan.added + plan.changed)
+
+        self.build_indexes()
+
+        self.manifest.files = plan.entries
+        self.manifest.save()
+        return plan
+
+    def build_indexes(self, rebuild_keyword_index=False, rebuild_vector_index=False):
+        """
+        Builds the full-text index for hybrid retrieval if it is missing, and
+        the ANN index once the store is large enough. Either is rebuilt once too
+        many rows were added since it was built.
+        """
+        if not self.has_vectors():
+            return
+        table = self.vector_store.table
+        if self.hybrid_config.get("enabled", False) and (
+            rebuild_keyword_index or needs_keyword_index(table, self.hybrid_config)
+        ):
+            create_keyword_index(table)
+        if rebuild_vector_index or needs_vector_index(table, self.vector_index_config):
+            create_vector_index(table, self.vector_index_config)
+
+    def embed_files(self, file_paths):
+        """
+        Parses, chunks and embeds the given files.
+
+        Chunks are embedded and inserted as soon as there are enough of them to
+        fill every in-flight embedding request, while the remaining files are
+        still being parsed.
+        """
+        node_parser = SentenceSplitter()
+        flush_size = self.batcher.batch_size * self.batcher.max_concurrent_requests
+        nodes = []
+        for documents in self.loader.iter_documents(file_paths):
+            nodes.extend(node_parser(documents))
+            if len(nodes) >= flush_size:
+                self.insert_nodes(nodes)
+                nodes = []
+        if nodes:
+            self.insert_nodes(nodes)
+
+    def insert_nodes(self, nodes):
+        self.index.insert_nodes(self.batcher.embed_nodes(nodes))
+
+    def has_vectors(self):
+        return get_table(self.vector_store) is not None
+
+    def delete_file_vectors(self, file_paths):
+        """
+        Deletes all vectors that were created from the given files.
+        """
+        if not file_paths or not self.has_vectors():
+            return
+        for start in range(0, len(file_paths), DELETE_BATCH_SIZE):
+            values = ", ".join(
+                quote_filter_value(path)
+                for path in file_paths[start : start + DELETE_BATCH_SIZE]
+            )
+            self.vector_store.table.delete(f"metadata.file_path IN ({values})")
@@ -0,0 +1,145 @@
+import re
+
+import numpy as np
+
+from context_window import estimate_tokens
+
+DEFAULT_MMR_LAMBDA = 0.5
+DEFAULT_CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+MIN_TERM_LENGTH = 3
+
+
+def tokenize(text):
+    return {
+        term
+        for term in re.findall(r"\w+", text.lower())
+        if len(term) >= MIN_TERM_LENGTH
+    }
+
+
+def jaccard_similarity(terms, other_terms):
+    if not terms or not other_terms:
+        return 0.0
+    return len(terms & other_terms) / len(terms | other_terms)
+
+
+def cosine_similarity(embedding, other_embedding):
+    a = np.asarray(embedding)
+    b = np.asarray(other_embedding)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+
+class Reranker:
+    """
+    Reorders over-fetched chunks and keeps the best top_k of them that fit into
+    a token budget.
+
+    Methods:
+    - "none": keep the retrieval order
+    - "lexical": rank by the share of query terms that occur in the chunk
+    - "mmr": maximal marginal relevance, trading retrieval score for diversity
+    - "cross_encoder": score query and chunk pairs with a local cross-encoder
+      (requires the sentence-transformers package)
+    """
+
+    def __init__(self, top_k, config):
+        self.top_k = top_k
+        self.method = config.get("method", "none")
+        self.max_context_tokens = config.get("max_context_tokens")
+        self.mmr_lambda = config.get("mmr_lambda", DEFAULT_MMR_LAMBDA)
+        self.cross_encoder = None
+        if self.method == "cross_encoder":
+            from sentence_transformers import CrossEncoder
+
+            self.cross_encoder = CrossEncoder(
+                config.get("cross_encoder_model", DEFAULT_CROSS_ENCODER_MODEL)
+            )
+
+    def rerank(self, query, nodes):
+        """
+        Returns the selected nodes, best first.
+        """
+        if self.method == "lexical":
+            nodes = self.rank_lexical(query, nodes)
+        elif self.method == "mmr":
+            nodes = self.rank_mmr(nodes)
+        elif self.method == "cross_encoder":
+            nodes = self.rank_cross_encoder(query, nodes)
+        return self.select(nodes)
+
+    def rank_lexical(self, query, nodes):
+        query_terms = tokenize(query)
+        if not query_terms:
+            return nodes
+        scores = [
+            len(query_terms & tokenize(node.node.get_content())) / len(query_terms)
+            for node in nodes
+        ]
+        # sorted() is stable, so ties keep their retrieval order
+        order = sorted(range(len(nodes)), key=lambda i: scores[i], reverse=True)
+        for i in order:
+            nodes[i].score = scores[i]
+        return [nodes[i] for i in order]
+
+    def rank_mmr(self, nodes):
+        """
+        Picks nodes one by one, maximizing relevance minus the similarity to the
+        nodes already picked. Relevance is the normalized retrieval score;
+        similarity uses the embeddings if both nodes have one and term overlap
+        otherwise.
+        """
+        if not nodes:
+            return nodes
+        scores = np.array([node.score or 0.0 for node in nodes])
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread else np.ones(len(nodes))
+        terms = [tokenize(node.node.get_content()) for node in nodes]
+
+        def similarity(i, j):
+            if nodes[i].node.embedding and nodes[j].node.embedding:
+                return cosine_similarity(
+                    nodes[i].node.embedding, nodes[j].node.embedding
+                )
+            return jaccard_similarity(terms[i], terms[j])
+
+        picked = []
+        remaining = list(range(len(nodes)))
+        while remaining and len(picked) < self.top_k:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i]
+                - (1 - self.mmr_lambda)
+                * max((similarity(i, j) for j in picked), default=0.0),
+            )
+            picked.append(best)
+            remaining.remove(best)
+        return [nodes[i] for i in picked]
+
+    def rank_cross_encoder(self, query, nodes):
+        if not nodes:
+            return nodes
+        scores = self.cross_encoder.predict(
+            [(query, node.node.get_content()) for node in nodes]
+        )
+        for node, score in zip(nodes, scores):
+            node.score = float(score)
+        return sorted(nodes, key=lambda node: node.score, reverse=True)
+
+    def select(self, nodes):
+        """
+        Keeps the first top_k nodes, stopping once the token budget is used up.
+        The best node is always kept.
+        """
+        selected = []
+        tokens = 0
+        for node in nodes[: self.top_k]:
+            node_tokens = estimate_tokens(node.node.get_content())
+            if (
+                selected
+                and self.max_context_tokens
+                and tokens + node_tokens > self.max_context_tokens
+            ):
+                break
+            selected.append(node)
+            tokens += node_tokens
+        return selected
@@ -1,11 +1,10 @@
 from copy import deepcopy
-import os
+from session_storage import create_session_storage
 from util import (
     get_app_save_dir,
-    load_data,
-    save_data,
     generate_timestamp,
     generate_message_ids,
+    generate_session_preview,
 )
 
 
@@ -17,8 +16,14 @@ class SessionManager:
     def __init__(self):
         self.last_action = None
         self.sessions = []
+        self.session_indexes = {}
+        self.session_versions = {}
         self.current_session_id = None
         self.sidebar_scrollpos = 0
+        self.sidebar_window_start = None
+        self.storage = create_session_storage(
+            self.get_session_save_dir(), self.get_sessions_snapshot
+        )
         self.load_sessions_from_disk()
 
     def get_all_sessions(self):
@@ -43,14 +48,7 @@ class SessionManager:
         """
         Returns the index of the current session in the list of sessions.
         """
-        return next(
-            (
-                index
-                for (index, session) in enumerate(self.sessions)
-                if session["id"] == self.current_session_id
-            ),
-            None,
-        )
+        return self.session_indexes.get(self.current_session_id)
 
     def get_messages_for_current_session(self):
         """
@@ -73,36 +71,56 @@ class SessionManager:
         }
         if session:
             session["messages"].append(message)
+            session["preview"] = generate_session_preview(session["messages"])
+            self.bump_session_version(session["id"])
             self.last_action = {"action": "add_message", "data": session}
-        self.save_sessions_to_disk()
+            self.storage.add_message(session["id"], message, session["preview"])
 
-    def add_assistant_message(self, content, timestamp, id):
+    def add_assistant_message(
+        self, session_id, content, timestamp, id, cached=False, stats=None, error=False
+    ):
         """
-        Adds an assistant message to the current session.
+        Adds an assistant message to the given session, which is not
+        necessarily the current one once the response has been generated.
+        The Ollama generation stats are stored with the message. Failed
+        responses are marked as errors and left out of the chat context.
         """
-        session = self.get_session_by_id(self.current_session_id)
+        session = self.get_session_by_id(session_id)
         message = {
             "role": "assistant",
             "content": content,
             "timestamp": timestamp,
             "id": id,
         }
+        if cached:
+            message["cached"] = True
+        if stats:
+            message["stats"] = stats
+        if error:
+            message["error"] = True
         if session:
             session["messages"].append(message)
-        self.save_sessions_to_disk()
+            session["preview"] = generate_session_preview(session["messages"])
+            self.bump_session_version(session["id"])
+            self.storage.add_message(session["id"], message, session["preview"])
 
-    def generate_empty_assistant_message(self):
+    def generate_empty_assistant_message(self, session_id=None):
         """
         Generates an empty assistant message with a timestamp and ID.
         """
-        return "assistant", self.generate_timestamp(), self.generate_next_message_id()
+        return (
+            "assistant",
+            self.generate_timestamp(),
+            self.generate_next_message_id(session_id),
+        )
 
-    def generate_next_message_id(self):
+    def generate_next_message_id(self, session_id=None):
         """
-        Generates a unique ID for the next message in the current session.
+        Generates a unique ID for the next message in the given session,
+        defaulting to the current one.
         """
-        session = self.get_session_by_id(self.current_session_id)
-        last_id = int(session["messages"][-1]["id"].split("-")[1])
+        session = self.get_session_by_id(session_id or self.current_session_id)
+        last_id = int(session["messages"][-1]["id"].rsplit("-", 1)[1])
         return f"{session['id']}-{last_id + 1}"
 
     def set_current_session(self, session_id, action):
@@ -112,15 +130,79 @@ class SessionManager:
         self.current_session_id = session_id
         session = self.get_session_by_id(self.current_session_id)
         self.last_action = {"action": action, "data": session}
-        self.save_sessions_to_disk()
+        self.storage.set_current_session(session_id)
 
     def get_session_by_id(self, session_id):
         """
-        Returns the session with the given ID.
+        Returns the session with the given ID, loading its messages if needed.
         """
-        return next(
-            (session for session in self.sessions if session["id"] == session_id), None
-        )
+        session = self.get_session_metadata(session_id)
+        if session and "messages" not in session:
+            session["messages"] = self.storage.load_messages(session_id)
+        return session
+
+    def get_session_version(self, session_id):
+        """
+        Returns a counter that changes whenever messages are added to the session.
+        """
+        return self.session_versions.get(session_id, 0)
+
+    def bump_session_version(self, session_id):
+        self.session_versions[session_id] = self.get_session_version(session_id) + 1
+
+    def get_session_metadata(self, session_id):
+        """
+        Returns the session with the given ID without loading its messages.
+        """
+        index = self.session_indexes.get(session_id)
+        if index is None:
+            return None
+        return self.sessions[index]
+
+    def get_session_messages(self, session_id, offset=0, limit=None):
+        """
+        Returns a page of the messages of the given session.
+        """
+        session = self.get_session_metadata(session_id)
+        if not session:
+            return []
+        if "messages" in session:
+            end = None if limit is None else offset + limit
+            return session["messages"][offset:end]
+        return self.storage.load_messages(session_id, offset, limit)
+
+    def get_last_session_messages(self, session_id, count):
+        """
+        Returns the last messages of the given session.
+        """
+        total = self.get_session_message_count(session_id)
+        return self.get_session_messages(session_id, max(total - count, 0))
+
+    def get_session_message_count(self, session_id):
+        """
+        Returns the number of messages in the given session.
+        """
+        session = self.get_session_metadata(session_id)
+        if not session:
+            return 0
+        if "messages" in session:
+            return len(session["messages"])
+        return self.storage.count_messages(session_id)
+
+    def get_session_preview(self, session_id):
+        """
+        Returns the sidebar preview of the given session. Previews are cached on
+        the session and only generated from its messages if missing.
+        """
+        session = self.get_session_metadata(session_id)
+        if not session:
+            return ""
+        if "preview" not in session:
+            session["preview"] = generate_session_preview(
+                self.get_last_session_messages(session_id, 4)
+            )
+            self.storage.set_session_preview(session_id, session["preview"])
+        return session["preview"]
 
     def get_session_count(self):
         """
@@ -132,8 +214,7 @@ class SessionManager:
         """
         Checks if a session with the given name exists.
         """
-        session_names = [session["id"] for session in self.sessions]
-        return session_name in session_names
+        return session_name in self.session_indexes
 
     def add_session(self, new_session_name, chat_app):
         """
@@ -151,55 +232,74 @@ class SessionManager:
             )
         ]
 
-        self.sessions.append(
-            {
-                "id": new_session_name,
-                "app": chat_app["id"],
-                "scroll_pos": 0,
-                "messages": initial_messages,
-            },
-        )
+        session = {
+            "id": new_session_name,
+            "app": chat_app["id"],
+            "scroll_pos": 0,
+            "preview": generate_session_preview(initial_messages),
+            "messages": initial_messages,
+        }
+        self.session_indexes[session["id"]] = len(self.sessions)
+        self.sessions.append(session)
+        self.storage.add_session(session)
         self.set_current_session(new_session_name, "add_chat")
-        self.save_sessions_to_disk()
 
-    def set_current_session_scrollpos(self, current_scroll_pos):
+    def set_current_session_scrollpos(self, current_scroll_pos, window_start=0):
         """
-        Sets the scroll position for the current session.
+        Sets the scroll position and the first rendered message for the current
+        session.
         """
-        session = self.get_session_by_id(self.current_session_id)
+        session = self.get_session_metadata(self.current_session_id)
         if session:
             session["scroll_pos"] = current_scroll_pos
-        self.save_sessions_to_disk()
+            session["window_start"] = window_start
+            self.storage.set_scroll_pos(session["id"], current_scroll_pos, window_start)
 
     def get_current_session_scrollpos(self):
         """
         Returns the scroll position for the current session.
         """
-        session = self.get_session_by_id(self.current_session_id)
+        session = self.get_session_metadata(self.current_session_id)
 
         if session:
             return session["scroll_pos"]
 
         return
 
+    def get_current_session_window_start(self):
+        """
+        Returns the index of the first rendered message for the current session.
+        """
+        session = self.get_session_metadata(self.current_session_id)
+
+        if session:
+            return session.get("window_start")
+
+        return
+
     def load_sessions_from_disk(self):
-        session_path = os.path.join(self.get_session_save_dir(), "session.json")
-        data = load_data(session_path)
-        if data:
-            self.current_session_id = data.get("last_session")
-            self.sidebar_scrollpos = data.get("sidebar_scrollpos")
-            self.sessions = data.get("sessions", [])
+        data = self.storage.load()
+        self.current_session_id = data["last_session"]
+        self.sidebar_scrollpos = data["sidebar_scrollpos"]
+        self.sidebar_window_start = data.get("sidebar_window_start")
+        self.sessions = data["sessions"]
+        self.session_indexes = {
+            session["id"]: index for index, session in enumerate(self.sessions)
+        }
 
     def save_sessions_to_disk(self):
-        session_path = os.path.join(self.get_session_save_dir(), "session.json")
-        save_data(
-            {
-                "last_session": self.current_session_id,
-                "sidebar_scrollpos": self.sidebar_scrollpos,
-                "sessions": self.sessions,
-            },
-            session_path,
-        )
+        """
+        Flushes pending changes, compacting the journal into a snapshot.
+        """
+        self.storage.compact()
+
+    def get_sessions_snapshot(self):
+        return {
+            "last_session": self.current_session_id,
+            "sidebar_scrollpos": self.sidebar_scrollpos,
+            "sidebar_window_start": self.sidebar_window_start,
+            "sessions": self.sessions,
+        }
 
     def get_session_save_dir(self):
         return get_app_save_dir("ollama-rag-tui")
@@ -210,9 +310,13 @@ class SessionManager:
     def generate_message_ids(self, session_name, count=1):
         return generate_message_ids(session_name, count)
 
-    def set_sidebar_scrollpos(self, scrollpos):
+    def set_sidebar_scrollpos(self, scrollpos, window_start=0):
         self.sidebar_scrollpos = scrollpos
-        self.save_sessions_to_disk()
+        self.sidebar_window_start = window_start
+        self.storage.set_sidebar_scrollpos(scrollpos, window_start)
 
     def get_sidebar_scrollpos(self):
         return self.sidebar_scrollpos
+
+    def get_sidebar_window_start(self):
+        return self.sidebar_window_start
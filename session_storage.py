@@ -0,0 +1,373 @@
+import json
+import os
+import sqlite3
+
+from util import (
+    generate_session_preview,
+    get_setting,
+    load_data,
+    save_data_atomic,
+)
+
+
+def apply_journal_record(snapshot, record):
+    """
+    Applies a single journal record to a sessions snapshot.
+    """
+    sessions = snapshot["sessions"]
+    op = record["op"]
+    if op == "add_session":
+        if not any(session["id"] == record["session"]["id"] for session in sessions):
+            sessions.append(record["session"])
+    elif op == "add_message":
+        session = next((s for s in sessions if s["id"] == record["session"]), None)
+        if session:
+            session["messages"].append(record["message"])
+            session["preview"] = generate_session_preview(session["messages"])
+    elif op == "set_scroll_pos":
+        session = next((s for s in sessions if s["id"] == record["session"]), None)
+        if session:
+            session["scroll_pos"] = record["scroll_pos"]
+            session["window_start"] = record.get("window_start", 0)
+    elif op == "set_current_session":
+        snapshot["last_session"] = record["session"]
+    elif op == "set_sidebar_scrollpos":
+        snapshot["sidebar_scrollpos"] = record["scroll_pos"]
+        snapshot["sidebar_window_start"] = record.get("window_start", 0)
+
+
+def read_snapshot(snapshot_path):
+    snapshot = load_data(snapshot_path) or {}
+    snapshot.setdefault("last_session", None)
+    snapshot.setdefault("sidebar_scrollpos", 0)
+    snapshot.setdefault("sessions", [])
+    return snapshot
+
+
+def replay_journal(snapshot, journal_path):
+    """
+    Applies the journal records that are newer than the snapshot, without
+    writing anything.
+
+    Records that were already compacted into the snapshot are skipped, and
+    replay stops at the first incomplete line left by a crash. Returns the last
+    sequence number, whether any record was applied and whether the journal
+    ends with an incomplete line.
+    """
+    seq = snapshot.get("journal_seq", 0)
+    replayed = False
+    if not os.path.exists(journal_path):
+        return seq, replayed, False
+
+    with open(journal_path, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return seq, replayed, True
+            if record["seq"] > seq:
+                apply_journal_record(snapshot, record)
+                seq = record["seq"]
+                replayed = True
+            if not line.endswith("\n"):
+                # the next record would be appended to this line
+                return seq, replayed, True
+    return seq, replayed, False
+
+
+class JournalSessionStorage:
+    """
+    Persists sessions as a snapshot (session.json) plus an append-only journal.
+
+    Every mutation appends one line to the journal, so the cost of a write is
+    proportional to the change. Once the journal grows past a threshold it is
+    compacted into a new snapshot, which is replaced atomically.
+    """
+
+    def __init__(self, save_dir, snapshot_provider):
+        self.snapshot_path = os.path.join(save_dir, "session.json")
+        self.journal_path = os.path.join(save_dir, "session.journal")
+        self.snapshot_provider = snapshot_provider
+        self.compact_after = get_setting("session_storage", "compact_after", 500)
+        self.fsync = get_setting("session_storage", "fsync", False)
+        self.journal_file = None
+        self.journal_seq = 0
+        self.journal_records = 0
+
+    def load(self):
+        """
+        Loads the snapshot and replays the journal on top of it.
+
+        If anything was replayed, or the journal ends with an incomplete line
+        left by a crash, the snapshot is rewritten and the journal truncated
+        before new records are appended to it.
+        """
+        snapshot = read_snapshot(self.snapshot_path)
+        self.journal_seq, replayed, torn = replay_journal(snapshot, self.journal_path)
+        if replayed or torn:
+            self.write_snapshot(snapshot)
+        return snapshot
+
+    def add_session(self, session):
+        self.append({"op": "add_session", "session": session})
+
+    def add_message(self, session_id, message, preview=None):
+        self.append({"op": "add_message", "session": session_id, "message": message})
+
+    def set_session_preview(self, session_id, preview):
+        """
+        Previews are derived from the messages, so they are written with the
+        next snapshot instead of being journaled.
+        """
+
+    def set_scroll_pos(self, session_id, scroll_pos, window_start=0):
+        self.append(
+            {
+                "op": "set_scroll_pos",
+                "session": session_id,
+                "scroll_pos": scroll_pos,
+                "window_start": window_start,
+            }
+        )
+
+    def set_current_session(self, session_id):
+        self.append({"op": "set_current_session", "session": session_id})
+
+    def set_sidebar_scrollpos(self, scroll_pos, window_start=0):
+        self.append(
+            {
+                "op": "set_sidebar_scrollpos",
+                "scroll_pos": scroll_pos,
+                "window_start": window_start,
+            }
+        )
+
+    def append(self, record):
+        """
+        Appends a record to the journal and compacts it if it grew too large.
+        """
+        self.journal_seq += 1
+        if self.journal_file is None:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            self.journal_file = open(self.journal_path, "a")
+        self.journal_file.write(json.dumps({"seq": self.journal_seq, **record}) + "\n")
+        self.journal_file.flush()
+        if self.fsync:
+            os.fsync(self.journal_file.fileno())
+
+        self.journal_records += 1
+        if self.journal_records >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """
+        Writes a full snapshot and clears the journal.
+        """
+        self.write_snapshot(self.snapshot_provider())
+
+    def write_snapshot(self, snapshot):
+        save_data_atomic(
+            {**snapshot, "journal_seq": self.journal_seq}, self.snapshot_path
+        )
+        if self.journal_file is not None:
+            self.journal_file.close()
+        self.journal_file = open(self.journal_path, "w")
+        self.journal_records = 0
+
+
+class SqliteSessionStorage:
+    """
+    Persists sessions in a SQLite database (session.db).
+
+    Startup reads only session metadata; the messages of a session are loaded
+    when it is opened. An existing session.json (and journal) is migrated into
+    the database until a migration has completed.
+    """
+
+    def __init__(self, save_dir, snapshot_provider=None):
+        self.save_dir = save_dir
+        self.db_path = os.path.join(save_dir, "session.db")
+        os.makedirs(save_dir, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_schema()
+        if not self.get_meta("migrated"):
+            self.migrate_from_json()
+
+    def create_schema(self):
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    scroll_pos REAL NOT NULL DEFAULT 0,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_position
+                    ON sessions (position);
+                CREATE UNIQUE INDEX IF NOT EXISTS messages_session_position
+                    ON messages (session_id, position);
+                """)
+
+    def migrate_from_json(self):
+        """
+        Imports session.json and its journal into the database, without
+        changing either file.
+
+        The "migrated" meta key is set in the same transaction, so a failed
+        migration is retried on the next start. Databases created before the
+        key existed already contain their sessions and are only marked.
+        """
+        snapshot_path = os.path.join(self.save_dir, "session.json")
+        (has_sessions,) = self.connection.execute(
+            "SELECT EXISTS (SELECT 1 FROM sessions)"
+        ).fetchone()
+        with self.connection:
+            if os.path.exists(snapshot_path) and not has_sessions:
+                snapshot = read_snapshot(snapshot_path)
+                replay_journal(snapshot, os.path.join(self.save_dir, "session.journal"))
+                for session in snapshot["sessions"]:
+                    if "id" in session:
+                        self.insert_session(session)
+                self.set_meta("last_session", snapshot["last_session"])
+                self.set_meta("sidebar_scrollpos", snapshot["sidebar_scrollpos"])
+                self.set_meta(
+                    "sidebar_window_start", snapshot.get("sidebar_window_start")
+                )
+            self.set_meta("migrated", True)
+
+    def load(self):
+        """
+        Returns the snapshot with session metadata only; sessions carry no
+        "messages" key until they are loaded with load_messages.
+        """
+        sessions = []
+        for session_id, scroll_pos, data in self.connection.execute(
+            "SELECT id, scroll_pos, data FROM sessions ORDER BY position"
+        ):
+            sessions.append(
+                {**json.loads(data), "id": session_id, "scroll_pos": scroll_pos}
+            )
+        return {
+            "last_session": self.get_meta("last_session"),
+            "sidebar_scrollpos": self.get_meta("sidebar_scrollpos", 0),
+            "sidebar_window_start": self.get_meta("sidebar_window_start"),
+            "sessions": sessions,
+        }
+
+    def load_messages(self, session_id, offset=0, limit=None):
+        """
+        Returns the messages of a session in order, optionally a single page.
+        """
+        rows = self.connection.execute(
+            "SELECT data FROM messages WHERE session_id = ? "
+            "ORDER BY position LIMIT ? OFFSET ?",
+            (session_id, -1 if limit is None else limit, offset),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def count_messages(self, session_id):
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return count
+
+    def add_session(self, session):
+        with self.connection:
+            self.insert_session(session)
+
+    def insert_session(self, session):
+        (position,) = self.connection.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM sessions"
+        ).fetchone()
+        data = {
+            key: value
+            for key, value in session.items()
+            if key not in ["id", "scroll_pos", "messages"]
+        }
+        self.connection.execute(
+            "INSERT INTO sessions (id, position, scroll_pos, data) VALUES (?, ?, ?, ?)",
+            (session["id"], position, session.get("scroll_pos") or 0, json.dumps(data)),
+        )
+        self.connection.executemany(
+            "INSERT INTO messages (session_id, position, data) VALUES (?, ?, ?)",
+            [
+                (session["id"], index, json.dumps(message))
+                for index, message in enumerate(session.get("messages", []))
+            ],
+        )
+
+    def add_message(self, session_id, message, preview=None):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO messages (session_id, position, data) "
+                "SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM messages "
+                "WHERE session_id = ?",
+                (session_id, json.dumps(message), session_id),
+            )
+            if preview is not None:
+                self.update_session_preview(session_id, preview)
+
+    def set_session_preview(self, session_id, preview):
+        with self.connection:
+            self.update_session_preview(session_id, preview)
+
+    def update_session_preview(self, session_id, preview):
+        self.connection.execute(
+            "UPDATE sessions SET data = json_set(data, '$.preview', ?) WHERE id = ?",
+            (preview, session_id),
+        )
+
+    def set_scroll_pos(self, session_id, scroll_pos, window_start=0):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE sessions SET scroll_pos = ?, "
+                "data = json_set(data, '$.window_start', ?) WHERE id = ?",
+                (scroll_pos, window_start, session_id),
+            )
+
+    def set_current_session(self, session_id):
+        with self.connection:
+            self.set_meta("last_session", session_id)
+
+    def set_sidebar_scrollpos(self, scroll_pos, window_start=0):
+        with self.connection:
+            self.set_meta("sidebar_scrollpos", scroll_pos)
+            self.set_meta("sidebar_window_start", window_start)
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)),
+        )
+
+    def compact(self):
+        """
+        Every change is committed immediately, so there is nothing to compact.
+        """
+        self.connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def create_session_storage(save_dir, snapshot_provider):
+    """
+    Creates the session storage selected by the session_storage.backend setting.
+    """
+    if get_setting("session_storage", "backend", "journal") == "sqlite":
+        return SqliteSessionStorage(save_dir, snapshot_provider)
+    return JournalSessionStorage(save_dir, snapshot_provider)
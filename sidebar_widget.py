@@ -1,16 +1,30 @@
+import asyncio
+
+from textual import on
 from textual.app import ComposeResult
 from textual.reactive import reactive
 from textual.widgets import ListItem, ListView, Static, Button
 from textual.containers import Horizontal
 from textual.widget import Widget
 from textual.binding import Binding, BindingType
+from textual.css.query import NoMatches
+from textual.events import MouseScrollDown, MouseScrollUp
 
-from chat_message_event import FocusChatTextArea, FocusChatContainer, SaveAndQuitMessage
+from chat_message_event import (
+    FocusChatTextArea,
+    FocusChatContainer,
+    SaveAndQuitMessage,
+    SessionPageRequested,
+)
+from util import get_setting
 
 
 class SidebarWidget(Widget):
     """
     The sidebar widget that displays a list of chat sessions.
+
+    Only a window of session previews is mounted; further sessions are paged
+    in while scrolling, so the sidebar stays fast with thousands of sessions.
     """
 
     sidebar_update_trigger = reactive("")
@@ -18,6 +32,11 @@ class SidebarWidget(Widget):
     def __init__(self, session_manager, **kw):
         super().__init__(**kw)
         self.session_manager = session_manager
+        self.page_size = get_setting("rendering", "sidebar_page_size", 100)
+        self.max_mounted_sessions = self.page_size * 3
+        self.window_start = 0
+        self.page_lock = asyncio.Lock()
+        self.generation_states = {}
 
     def watch_sidebar_update_trigger(self, data) -> None:
         """
@@ -29,10 +48,10 @@ class SidebarWidget(Widget):
         """
         Composes the sidebar user interface.
         """
-        previews = []
-        for preview in self.session_manager.get_all_sessions():
-            prev = self.create_session_preview(preview)
-            previews.append(prev)
+        self.window_start = self.get_initial_window_start()
+        previews = self.generate_session_previews(
+            self.window_start, self.max_mounted_sessions
+        )
 
         initial_index = (
             0
@@ -41,7 +60,9 @@ class SidebarWidget(Widget):
         )
 
         self.container = ChatSessionListView(
-            *previews, id="sidebar-listview", initial_index=initial_index
+            *previews,
+            id="sidebar-listview",
+            initial_index=max(initial_index - self.window_start, 0),
         )
         yield self.container
 
@@ -55,18 +76,40 @@ class SidebarWidget(Widget):
             id="sidebar-button-container",
         )
 
+    def get_initial_window_start(self):
+        """
+        Returns the saved window start, or a window around the current session.
+        """
+        window_start = self.session_manager.get_sidebar_window_start()
+        if window_start is not None and (
+            window_start < self.session_manager.get_session_count()
+        ):
+            return window_start
+        current_index = self.session_manager.get_current_session_index() or 0
+        return max(current_index - self.page_size, 0)
+
+    def generate_session_previews(self, start, count):
+        """
+        Creates preview widgets for a slice of the sessions.
+        """
+        return [
+            self.create_session_preview(session)
+            for session in self.session_manager.get_all_sessions()[
+                start : start + count
+            ]
+        ]
+
     def create_session_preview(self, session):
         """
         Creates a preview widget for a chat session.
         """
-        return StaticItem(
-            SessionPreviewWidget(
-                self.generate_preview(session["messages"]),
-                classes="previewSession",
-                id=session["id"],
-            ),
-            id=f"previewItem{session['id']}",
+        preview = SessionPreviewWidget(
+            self.session_manager.get_session_preview(session["id"]),
+            classes="previewSession",
+            id=session["id"],
         )
+        preview.border_subtitle = self.generation_states.get(session["id"])
+        return StaticItem(preview, id=f"previewItem{session['id']}")
 
     def update(self):
         """
@@ -76,11 +119,11 @@ class SidebarWidget(Widget):
         if not last_action:
             return
         if last_action["action"] == "add_chat":
-            self.add_session_preview(last_action["data"])
+            self.run_worker(self.add_session_preview(last_action["data"]))
         elif last_action["action"] == "add_message":
-            self.update_session_preview(last_action["session"])
+            self.update_session_preview(last_action["data"])
         elif last_action["action"] == "remove_chat":
-            self.delete_session_preview(last_action["session"])
+            self.delete_session_preview(last_action["data"])
 
     def focus_session_preview(self, session):
         """
@@ -88,30 +131,48 @@ class SidebarWidget(Widget):
         """
         self.get_widget_by_id(session["id"]).focus()
 
-    def generate_preview(self, content, limit=71):
+    async def add_session_preview(self, session):
         """
-        Generates a preview string for the given chat session messages.
+        Adds a new preview widget for the given session.
         """
-        output = ""
-        for msg in content[-4:]:
-            content = msg["content"][:limit] + (msg["content"][limit:] and "...")
-            output += f"{msg['role']}: {content}\n"
-        return output.strip()
+        async with self.page_lock:
+            session_count = self.session_manager.get_session_count()
+            if self.window_start + len(self.container) < session_count - 1:
+                await self.show_window(max(session_count - self.page_size, 0))
+            else:
+                await self.container.append(self.create_session_preview(session))
+            self.container.index = len(self.container) - 1
 
-    def add_session_preview(self, session):
+    def update_session_preview(self, session):
         """
-        Adds a new preview widget for the given session.
+        Updates the preview widget for the given session, if it is mounted.
         """
-        session_preview = self.create_session_preview(session)
-        self.container.append(session_preview)
-        self.container.index = self.session_manager.get_session_count() - 1
+        try:
+            preview = self.container.get_widget_by_id(session["id"])
+        except NoMatches:
+            return
+        preview.update(self.session_manager.get_session_preview(session["id"]))
 
-    def update_session_preview(self, session):
+    def set_generation_state(self, session_id, state):
+        """
+        Shows the generation state of the session below its preview.
+        """
+        if state:
+            self.generation_states[session_id] = state
+        else:
+            self.generation_states.pop(session_id, None)
+        try:
+            preview = self.container.get_widget_by_id(session_id)
+        except NoMatches:
+            return
+        preview.border_subtitle = state
+
+    def clear_generation_state(self, session_id):
         """
-        Updates the preview widget for the given session.
+        Removes the marker of a finished generation once the session is opened.
         """
-        preview = self.container.get_widget_by_id(session["id"])
-        preview.update(session["content"])
+        if self.generation_states.get(session_id) in ["done", "cancelled", "failed"]:
+            self.set_generation_state(session_id, None)
 
     def delete_session_preview(self, session):
         """
@@ -120,6 +181,93 @@ class SidebarWidget(Widget):
         self.container.get_widget_by_id(session["id"]).remove()
         self.container.get_widget_by_id(f"previewItem{session['id']}").remove()
 
+    def save_scroll_state(self):
+        """
+        Saves the scroll position and the mounted window of the sidebar.
+        """
+        self.session_manager.set_sidebar_scrollpos(
+            self.container.scroll_y, self.window_start
+        )
+
+    @on(SessionPageRequested)
+    async def page_sessions(self, event: SessionPageRequested):
+        """
+        Pages further sessions into the mounted window.
+        """
+        async with self.page_lock:
+            session_count = self.session_manager.get_session_count()
+            if event.direction == "older":
+                await self.load_previous_sessions()
+            elif event.direction == "newer":
+                await self.load_next_sessions()
+            elif event.direction == "first":
+                if self.window_start > 0:
+                    await self.show_window(0)
+                self.container.index = 0
+            elif event.direction == "last":
+                if self.window_start + len(self.container) < session_count:
+                    await self.show_window(max(session_count - self.page_size, 0))
+                self.container.index = len(self.container) - 1
+
+    async def show_window(self, window_start):
+        """
+        Replaces the mounted previews with the window starting at window_start.
+        """
+        self.window_start = window_start
+        await self.container.clear()
+        await self.container.extend(
+            self.generate_session_previews(window_start, self.max_mounted_sessions)
+        )
+
+    async def load_previous_sessions(self):
+        """
+        Prepends the previous page and unmounts previews beyond the window size
+        at the bottom.
+        """
+        if self.window_start == 0:
+            return
+        start = max(self.window_start - self.page_size, 0)
+        items = self.generate_session_previews(start, self.window_start - start)
+        anchor = self.container.children[0] if len(self.container) else None
+        index = self.container.index
+        await self.container.insert(0, items)
+        self.window_start = start
+
+        excess = len(self.container) - self.max_mounted_sessions
+        if excess > 0:
+            count = len(self.container)
+            await self.container.remove_items(range(count - excess, count))
+        if index is not None:
+            self.container.index = index + len(items)
+        if anchor:
+            self.container.call_after_refresh(
+                self.container.scroll_to_widget, anchor, top=True, animate=False
+            )
+
+    async def load_next_sessions(self):
+        """
+        Appends the next page and unmounts previews beyond the window size at
+        the top.
+        """
+        start = self.window_start + len(self.container)
+        if start >= self.session_manager.get_session_count():
+            return
+        items = self.generate_session_previews(start, self.page_size)
+        anchor = self.container.children[-1] if len(self.container) else None
+        index = self.container.index
+        await self.container.extend(items)
+
+        excess = len(self.container) - self.max_mounted_sessions
+        if excess > 0:
+            await self.container.remove_items(range(excess))
+            self.window_start += excess
+            if index is not None:
+                self.container.index = max(index - excess, 0)
+        if anchor:
+            self.container.call_after_refresh(
+                self.container.scroll_to_widget, anchor, animate=False
+            )
+
 
 class SessionPreviewWidget(Static):
     """
@@ -185,14 +333,44 @@ class ChatSessionListView(ListView):
         """
         self.post_message(FocusChatContainer())
 
+    def on_mouse_scroll_up(self, event: MouseScrollUp) -> None:
+        """
+        Requests earlier sessions when scrolling up at the top of the list.
+        """
+        if self.scroll_y <= 0:
+            self.post_message(SessionPageRequested("older"))
+
+    def on_mouse_scroll_down(self, event: MouseScrollDown) -> None:
+        """
+        Requests later sessions when scrolling down at the bottom of the list.
+        """
+        if self.scroll_y >= self.max_scroll_y:
+            self.post_message(SessionPageRequested("newer"))
+
+    def action_cursor_up(self):
+        """
+        Moves the cursor up, paging in earlier sessions at the top.
+        """
+        if self.index == 0:
+            self.post_message(SessionPageRequested("older"))
+        super().action_cursor_up()
+
+    def action_cursor_down(self):
+        """
+        Moves the cursor down, paging in later sessions at the bottom.
+        """
+        if self.index == len(self) - 1:
+            self.post_message(SessionPageRequested("newer"))
+        super().action_cursor_down()
+
     def action_focus_first_element(self):
         """
-        Focus the first element in the list
+        Focus the first session
         """
-        self.index = 0
+        self.post_message(SessionPageRequested("first"))
 
     def action_focus_last_element(self):
         """
-        Focus the first element in the list
+        Focus the last session
         """
-        self.index = len(self.children) - 1
+        self.post_message(SessionPageRequested("last"))
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch):
+    """
+    Points the app save directory, and with it settings.json, at a temporary
+    directory.
+    """
+    monkeypatch.setenv("OLLAMA-RAG-TUI_PATH", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,82 @@
+import json
+
+from answer_cache import AnswerCache
+
+
+def create_cache(path, **config):
+    return AnswerCache(str(path), "v1", config)
+
+
+def test_stores_and_reloads_answers(tmp_path):
+    cache = create_cache(tmp_path)
+    cache.store("What is LanceDB?", [1.0, 0.0, 0.0], "A vector database.")
+    cache.store("What is Ollama?", [0.0, 1.0, 0.0], "A model runner.")
+
+    entries = json.loads((tmp_path / "answer_cache.json").read_text())["entries"]
+    assert all("embedding" not in entry for entry in entries)
+
+    cache = create_cache(tmp_path)
+    assert cache.lookup_exact("what is  lancedb?") == "A vector database."
+    assert cache.lookup_similar([0.1, 0.99, 0.0]) == "A model runner."
+    assert cache.lookup_similar([0.0, 0.0, 1.0]) is None
+
+
+def test_drops_entries_of_other_index_versions(tmp_path):
+    create_cache(tmp_path).store("question", [1.0, 0.0], "answer")
+
+    cache = AnswerCache(str(tmp_path), "v2", {})
+    assert cache.lookup_exact("question") is None
+
+
+def test_ignores_mismatched_embeddings(tmp_path):
+    cache = create_cache(tmp_path)
+    cache.store("first", [1.0, 0.0], "1")
+    embeddings = (tmp_path / "answer_cache.npy").read_bytes()
+    cache.store("second", [0.0, 1.0], "2")
+    # an interrupted save left the embeddings of the previous save
+    (tmp_path / "answer_cache.npy").write_bytes(embeddings)
+
+    cache = create_cache(tmp_path)
+    assert cache.lookup_exact("first") is None
+    assert cache.lookup_similar([1.0, 0.0]) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = create_cache(tmp_path, max_entries=2)
+    cache.store("first", [1.0, 0.0, 0.0], "1")
+    cache.store("second", [0.0, 1.0, 0.0], "2")
+    assert cache.lookup_exact("first") == "1"
+    cache.store("third", [0.0, 0.0, 1.0], "3")
+
+    cache = create_cache(tmp_path, max_entries=2)
+    assert cache.lookup_exact("second") is None
+    assert cache.lookup_similar([1.0, 0.0, 0.0]) == "1"
+    assert cache.lookup_similar([0.0, 0.0, 1.0]) == "3"
+
+
+def test_max_entries_zero_keeps_nothing(tmp_path):
+    cache = create_cache(tmp_path, max_entries=0)
+    cache.store("question", [1.0, 0.0], "answer")
+
+    assert cache.lookup_exact("question") is None
+    assert create_cache(tmp_path).lookup_exact("question") is None
+
+
+def test_skips_expired_entries(tmp_path):
+    cache = create_cache(tmp_path, ttl=60)
+    cache.store("question", [1.0, 0.0], "old answer")
+    cache.store("question", [1.0, 0.0], "new answer")
+    cache.entries[0]["created"] -= 120
+
+    assert cache.lookup_exact("question") == "new answer"
+    assert cache.lookup_similar([1.0, 0.0]) == "new answer"
+    assert [entry["answer"] for entry in cache.entries] == ["new answer"]
+
+
+def test_does_not_store_empty_answers(tmp_path):
+    cache = create_cache(tmp_path)
+    cache.store("question", [1.0, 0.0], "")
+    cache.store("question", [1.0, 0.0], "  \n")
+
+    assert cache.lookup_exact("question") is None
+    assert not (tmp_path / "answer_cache.json").exists()
@@ -0,0 +1,122 @@
+import asyncio
+
+from context_window import ContextWindow, estimate_tokens
+
+
+def create_window(summarizer=None, **context):
+    chat_app = {
+        "chat_app_type": {"name": "chat", "context": context},
+        "initial_messages": [{"role": "system", "content": "You are helpful."}],
+    }
+    return ContextWindow(chat_app, summarizer)
+
+
+def create_session(turns, words=20, error_at=()):
+    messages = [{"role": "system", "content": "You are helpful.", "id": "s-0"}]
+    for index in range(1, turns + 1):
+        message = {
+            "role": "user" if index % 2 else "assistant",
+            "content": f"message {index} " + "word " * words,
+            "id": f"s-{index}",
+        }
+        if index in error_at:
+            message["error"] = True
+        messages.append(message)
+    return {"id": "s", "messages": messages}
+
+
+def get_numbers(messages):
+    return [int(m["content"].split()[1]) for m in messages if m["role"] != "system"]
+
+
+def test_keeps_everything_that_fits():
+    session = create_session(6)
+    messages = asyncio.run(create_window().build_messages(session))
+    assert messages == session["messages"]
+
+
+def test_trims_oldest_messages_to_trim_ratio():
+    window = create_window(max_tokens=400, reserve_tokens=100, trim_ratio=0.5)
+    messages = asyncio.run(window.build_messages(create_session(40)))
+
+    assert messages[0]["role"] == "system"
+    numbers = get_numbers(messages)
+    assert numbers[-1] == 40
+    assert numbers == list(range(numbers[0], 41))
+    kept_tokens = sum(window.count_tokens(m) for m in messages[1:])
+    assert kept_tokens <= (400 - 100 - window.count_tokens(messages[0])) * 0.5
+
+
+def test_reuses_boundary_while_it_fits():
+    window = create_window(max_tokens=400, reserve_tokens=100, trim_ratio=0.5)
+    session = create_session(40)
+    first = get_numbers(asyncio.run(window.build_messages(session)))
+
+    session["messages"].append({"role": "user", "content": "short", "id": "s-41"})
+    second = asyncio.run(window.build_messages(session))
+    assert second[-1]["content"] == "short"
+    assert get_numbers(second[:-1])[0] == first[0]
+
+
+def test_error_messages_do_not_use_the_budget():
+    window = create_window(max_tokens=400, reserve_tokens=100, trim_ratio=0.5)
+    with_errors = create_session(40, error_at=range(30, 40))
+    messages = asyncio.run(window.build_messages(with_errors))
+
+    assert not any(message.get("error") for message in messages)
+    without_errors = asyncio.run(
+        create_window(
+            max_tokens=400, reserve_tokens=100, trim_ratio=0.5
+        ).build_messages(create_session(40))
+    )
+    assert len(messages) >= len(without_errors)
+
+
+def test_summarizes_dropped_messages_in_chunks_that_fit():
+    requests = []
+
+    async def summarize(messages):
+        requests.append(messages)
+        return f"summary {len(requests)}"
+
+    window = create_window(
+        summarize,
+        summarize=True,
+        max_tokens=400,
+        reserve_tokens=100,
+        summary_tokens=50,
+        trim_ratio=0.5,
+    )
+    messages = asyncio.run(window.build_messages(create_session(200)))
+
+    assert messages[1]["content"].endswith(f"summary {len(requests)}")
+    assert len(requests) > 1
+    for request in requests:
+        tokens = sum(estimate_tokens(message["content"]) for message in request)
+        assert tokens <= 400 - 100
+    # every chunk after the first continues the previous summary
+    for index, request in enumerate(requests[1:], start=1):
+        assert request[1]["content"].startswith(f"Summary so far: summary {index}")
+
+    # nothing new was dropped, so the summary is reused
+    count = len(requests)
+    asyncio.run(window.build_messages(create_session(200)))
+    assert len(requests) == count
+
+
+def test_truncates_messages_longer_than_a_chunk():
+    requests = []
+
+    async def summarize(messages):
+        requests.append(messages)
+        return "summary"
+
+    window = create_window(
+        summarize, summarize=True, max_tokens=400, reserve_tokens=100, summary_tokens=50
+    )
+    asyncio.run(window.build_messages(create_session(4, words=2000)))
+
+    assert requests
+    for request in requests:
+        tokens = sum(estimate_tokens(message["content"]) for message in request)
+        assert tokens <= 400 - 100
@@ -0,0 +1,82 @@
+import time
+
+from llama_index.core.schema import TextNode
+from llama_index.embeddings.ollama import OllamaEmbedding
+import pytest
+
+from embedding_batcher import EmbeddingBatcher
+from stub_ollama import StubOllama
+
+
+@pytest.fixture
+def stub():
+    with StubOllama(embed_dim=8, embed_latency=0.05) as stub:
+        yield stub
+
+
+def create_batcher(stub, **kwargs):
+    embed_model = OllamaEmbedding(model_name="stub-embed", base_url=stub.host)
+    return EmbeddingBatcher(embed_model, retry_backoff=0.01, **kwargs)
+
+
+def create_nodes(count):
+    return [TextNode(text=f"chunk {index}") for index in range(count)]
+
+
+def test_embeds_in_batches(stub):
+    batcher = create_batcher(stub, batch_size=4)
+    nodes = batcher.embed_nodes(create_nodes(10))
+
+    assert stub.embed_batch_sizes == [4, 4, 2]
+    assert [node.embedding for node in nodes] == [
+        stub.embed(f"chunk {index}") for index in range(10)
+    ]
+    assert batcher.progress.chunks_done == batcher.progress.chunks_total == 10
+
+
+def test_skips_embedded_nodes(stub):
+    nodes = create_nodes(3)
+    nodes[1].embedding = [0.0] * 8
+    create_batcher(stub, batch_size=4).embed_nodes(nodes)
+
+    assert stub.embed_batch_sizes == [2]
+    assert nodes[1].embedding == [0.0] * 8
+
+
+def test_limits_concurrent_requests(stub):
+    create_batcher(stub, batch_size=2, max_concurrent_requests=3).embed_nodes(
+        create_nodes(20)
+    )
+
+    assert sorted(stub.embed_batch_sizes) == [2] * 10
+    assert stub.max_embeds_in_flight == 3
+
+
+def test_retries_failed_requests(stub):
+    stub.embed_failures = 2
+    nodes = create_batcher(stub, batch_size=4, max_retries=2).embed_nodes(
+        create_nodes(4)
+    )
+
+    assert stub.requests["/api/embed"] == 3
+    assert all(node.embedding is not None for node in nodes)
+
+
+def test_raises_after_last_retry(stub):
+    stub.embed_failures = 3
+    batcher = create_batcher(stub, batch_size=4, max_retries=2)
+
+    with pytest.raises(Exception):
+        batcher.embed_nodes(create_nodes(4))
+    assert stub.requests["/api/embed"] == 3
+    assert batcher.progress.chunks_done == 0
+
+
+def test_throughput_clock_starts_with_first_embedding(stub):
+    batcher = create_batcher(stub, batch_size=4)
+    time.sleep(0.3)
+    assert batcher.progress.chunks_per_second() == 0.0
+
+    batcher.embed_nodes(create_nodes(4))
+    # one request of about embed_latency, not the idle time before it
+    assert batcher.progress.chunks_per_second() > 4 / 0.25
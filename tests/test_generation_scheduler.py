@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from generation_scheduler import GenerationScheduler
+
+
+class Generations:
+    """
+    Runs generations that hold their slot until they are finished.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.started = []
+        self.running = 0
+        self.max_running = 0
+        self.events = {}
+        self.tasks = {}
+
+    async def generate(self, session_id, model):
+        self.events[session_id] = asyncio.Event()
+        async with self.scheduler.slot(model, session_id):
+            self.started.append(session_id)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                await self.events[session_id].wait()
+            finally:
+                self.running -= 1
+
+    def start(self, session_id, model="model"):
+        self.tasks[session_id] = asyncio.create_task(self.generate(session_id, model))
+
+    async def finish(self, session_id):
+        self.events[session_id].set()
+        await self.tasks[session_id]
+        await asyncio.sleep(0)
+
+
+def run(test):
+    asyncio.run(test())
+
+
+def test_limits_running_generations():
+    async def test():
+        scheduler = GenerationScheduler(2, 2)
+        generations = Generations(scheduler)
+        for session_id in ["a", "b", "c", "d"]:
+            generations.start(session_id)
+        await asyncio.sleep(0)
+
+        assert generations.started == ["a", "b"]
+        assert scheduler.get_state("c") == "queued"
+        for session_id in ["a", "b", "c", "d"]:
+            await generations.finish(session_id)
+        assert generations.max_running == 2
+        assert scheduler.running == 0
+        assert scheduler.get_state("d") == "done"
+
+    run(test)
+
+
+def test_starts_queued_generations_in_order():
+    async def test():
+        scheduler = GenerationScheduler(1, 1)
+        generations = Generations(scheduler)
+        for session_id in ["a", "b", "c", "d"]:
+            generations.start(session_id)
+            await asyncio.sleep(0)
+
+        for session_id in ["a", "b", "c", "d"]:
+            await generations.finish(session_id)
+        assert generations.started == ["a", "b", "c", "d"]
+
+    run(test)
+
+
+def test_skips_queued_generations_of_busy_models():
+    async def test():
+        scheduler = GenerationScheduler(2, 1)
+        generations = Generations(scheduler)
+        generations.start("a1", "a")
+        generations.start("a2", "a")
+        generations.start("b1", "b")
+        await asyncio.sleep(0)
+
+        assert generations.started == ["a1", "b1"]
+        await generations.finish("a1")
+        assert generations.started == ["a1", "b1", "a2"]
+        await generations.finish("a2")
+        await generations.finish("b1")
+
+    run(test)
+
+
+def test_cancelling_a_queued_generation():
+    async def test():
+        states = []
+        scheduler = GenerationScheduler(1, 1)
+        scheduler.state_callback = lambda session_id, state: states.append(
+            (session_id, state)
+        )
+        generations = Generations(scheduler)
+        for session_id in ["a", "b", "c"]:
+            generations.start(session_id)
+            await asyncio.sleep(0)
+
+        generations.tasks["b"].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await generations.tasks["b"]
+        assert ("b", "cancelled") in states
+        assert len(scheduler.waiters) == 1
+
+        await generations.finish("a")
+        await generations.finish("c")
+        assert generations.started == ["a", "c"]
+        assert scheduler.running == 0
+
+    run(test)
+
+
+def test_cancelling_after_the_slot_was_granted():
+    async def test():
+        scheduler = GenerationScheduler(1, 1)
+        generations = Generations(scheduler)
+
+        def cancel_b(session_id, state):
+            # "b" got the slot, but is cancelled before it resumes
+            if session_id == "a" and state == "done":
+                generations.tasks["b"].cancel()
+
+        scheduler.state_callback = cancel_b
+        generations.start("a")
+        await asyncio.sleep(0)
+        generations.start("b")
+        await asyncio.sleep(0)
+
+        await generations.finish("a")
+        with pytest.raises(asyncio.CancelledError):
+            await generations.tasks["b"]
+        assert generations.started == ["a"]
+        assert scheduler.get_state("b") == "cancelled"
+        assert scheduler.running == 0
+        assert scheduler.running_per_model["model"] == 0
+
+    run(test)
+
+
+def test_failed_generation_releases_its_slot():
+    async def test():
+        scheduler = GenerationScheduler(1, 1)
+
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot("model", "a"):
+                raise RuntimeError("stream failed")
+        assert scheduler.get_state("a") == "failed"
+        assert scheduler.running == 0
+
+    run(test)
@@ -0,0 +1,32 @@
+import pytest
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from hybrid_retriever import reciprocal_rank_fusion
+
+
+def create_ranking(*node_ids):
+    return [
+        NodeWithScore(node=TextNode(id_=node_id, text=node_id)) for node_id in node_ids
+    ]
+
+
+def test_fuses_rankings():
+    vector = create_ranking("a", "b", "c")
+    keyword = create_ranking("c", "a")
+
+    fused = reciprocal_rank_fusion([vector, keyword], [1.0, 1.0], rrf_k=60)
+    assert [node.node.node_id for node in fused] == ["a", "c", "b"]
+    assert fused[0].score == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2].score == pytest.approx(1 / 62)
+
+
+def test_weights_rankings():
+    vector = create_ranking("a", "b")
+    keyword = create_ranking("b", "a")
+
+    fused = reciprocal_rank_fusion([vector, keyword], [1.0, 2.0])
+    assert [node.node.node_id for node in fused] == ["b", "a"]
+
+
+def test_fuses_empty_rankings():
+    assert reciprocal_rank_fusion([[], []], [1.0, 1.0]) == []
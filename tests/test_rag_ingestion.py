@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from rag_ingestion import IngestionManifest, RagIngestor
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    input_dir = tmp_path / "docs"
+    input_dir.mkdir()
+    (input_dir / "a.md").write_text("first document")
+    (input_dir / "b.md").write_text("second document")
+    (input_dir / "c.md").write_text("third document")
+    (input_dir / ".hidden.md").write_text("hidden")
+    (input_dir / "image.png").write_bytes(b"png")
+    return input_dir
+
+
+def create_ingestor(tmp_path, input_dir):
+    chat_app = {
+        "chat_app_type": {
+            "input_dir": str(input_dir),
+            "vector_store_path": str(tmp_path / "store"),
+        }
+    }
+    return RagIngestor(chat_app, None, None, None)
+
+
+def ingest(ingestor):
+    """
+    Records the planned files as ingested without embedding them.
+    """
+    plan = ingestor.plan()
+    ingestor.manifest.files = plan.entries
+    ingestor.manifest.save()
+    return plan
+
+
+def get_names(file_paths):
+    return [os.path.basename(file_path) for file_path in file_paths]
+
+
+def test_plans_all_files_of_a_new_store(tmp_path, corpus):
+    plan = create_ingestor(tmp_path, corpus).plan()
+
+    assert get_names(plan.added) == ["a.md", "b.md", "c.md"]
+    assert plan.changed == plan.removed == []
+    assert str(plan) == "3 added, 0 changed, 0 removed"
+
+
+def test_plans_nothing_for_an_unchanged_corpus(tmp_path, corpus):
+    ingest(create_ingestor(tmp_path, corpus))
+
+    plan = create_ingestor(tmp_path, corpus).plan()
+    assert not plan.has_changes()
+    assert len(plan.entries) == 3
+
+
+def test_touched_file_is_not_changed(tmp_path, corpus):
+    ingest(create_ingestor(tmp_path, corpus))
+    stat = os.stat(corpus / "a.md")
+    os.utime(corpus / "a.md", (stat.st_atime, stat.st_mtime + 10))
+
+    ingestor = create_ingestor(tmp_path, corpus)
+    version = ingestor.manifest.get_version()
+    plan = ingest(ingestor)
+    assert not plan.has_changes()
+    # the new mtime is recorded, so the file is not hashed again
+    assert plan.entries[str(corpus / "a.md")]["mtime"] == stat.st_mtime + 10
+    assert ingestor.manifest.get_version() == version
+
+
+def test_plans_changed_added_and_removed_files(tmp_path, corpus):
+    ingest(create_ingestor(tmp_path, corpus))
+    (corpus / "a.md").write_text("first document, edited")
+    (corpus / "c.md").unlink()
+    (corpus / "d.md").write_text("fourth document")
+
+    ingestor = create_ingestor(tmp_path, corpus)
+    version = ingestor.manifest.get_version()
+    plan = ingest(ingestor)
+    assert get_names(plan.changed) == ["a.md"]
+    assert get_names(plan.added) == ["d.md"]
+    assert get_names(plan.removed) == ["c.md"]
+    assert ingestor.manifest.get_version() != version
+
+
+def test_adopts_existing_files(tmp_path, corpus):
+    plan = create_ingestor(tmp_path, corpus).plan(adopt_existing=True)
+
+    assert not plan.has_changes()
+    assert len(plan.entries) == 3
+
+
+def test_manifest_lives_in_the_store(tmp_path, corpus):
+    manifest = IngestionManifest(str(tmp_path / "store"))
+    assert not manifest.exists()
+
+    ingest(create_ingestor(tmp_path, corpus))
+    manifest = IngestionManifest(str(tmp_path / "store"))
+    assert manifest.exists()
+    assert len(manifest.files) == 3
+
+
+def test_missing_input_dir_is_an_error(tmp_path):
+    ingestor = create_ingestor(tmp_path, tmp_path / "missing")
+
+    with pytest.raises(FileNotFoundError):
+        ingestor.plan()
@@ -0,0 +1,78 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from reranker import Reranker
+
+
+def create_nodes(*texts, scores=None, embeddings=None):
+    scores = scores or [1.0] * len(texts)
+    embeddings = embeddings or [None] * len(texts)
+    return [
+        NodeWithScore(
+            node=TextNode(id_=str(i), text=text, embedding=embedding), score=score
+        )
+        for i, (text, score, embedding) in enumerate(zip(texts, scores, embeddings))
+    ]
+
+
+def get_ids(nodes):
+    return [node.node.node_id for node in nodes]
+
+
+def test_keeps_retrieval_order_without_method():
+    nodes = create_nodes("first", "second", "third")
+
+    assert get_ids(Reranker(2, {}).rerank("query", nodes)) == ["0", "1"]
+
+
+def test_ranks_by_query_terms():
+    nodes = create_nodes(
+        "unrelated text",
+        "lancedb stores vectors",
+        "lancedb",
+        "vectors only",
+    )
+
+    reranked = Reranker(4, {"method": "lexical"}).rerank("lancedb vectors", nodes)
+    assert get_ids(reranked) == ["1", "2", "3", "0"]
+    assert [node.score for node in reranked] == [1.0, 0.5, 0.5, 0.0]
+
+
+def test_mmr_skips_near_duplicates():
+    nodes = create_nodes(
+        "best",
+        "duplicate",
+        "different",
+        scores=[1.0, 0.9, 0.5],
+        embeddings=[[1.0, 0.0], [1.0, 0.01], [0.0, 1.0]],
+    )
+
+    reranked = Reranker(2, {"method": "mmr"}).rerank("query", nodes)
+    assert get_ids(reranked) == ["0", "2"]
+
+
+def test_mmr_uses_term_overlap_without_embeddings():
+    nodes = create_nodes(
+        "ollama runs local models",
+        "ollama runs local models quickly",
+        "lancedb stores vectors",
+        "unrelated text",
+        scores=[1.0, 0.9, 0.7, 0.1],
+    )
+
+    reranked = Reranker(2, {"method": "mmr"}).rerank("query", nodes)
+    assert get_ids(reranked) == ["0", "2"]
+
+
+def test_stops_at_the_token_budget():
+    # every node is 40 characters, about 11 tokens
+    nodes = create_nodes("a" * 40, "b" * 40, "c" * 40)
+
+    reranker = Reranker(3, {"max_context_tokens": 25})
+    assert get_ids(reranker.rerank("query", nodes)) == ["0", "1"]
+
+
+def test_keeps_the_best_node_over_the_budget():
+    nodes = create_nodes("a" * 400, "b" * 40)
+
+    reranker = Reranker(2, {"max_context_tokens": 25})
+    assert get_ids(reranker.rerank("query", nodes)) == ["0"]
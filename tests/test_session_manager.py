@@ -0,0 +1,25 @@
+import pytest
+
+from session_manager import SessionManager
+
+CHAT_APP = {
+    "id": "chat",
+    "initial_messages": [{"role": "system", "content": "You are helpful."}],
+}
+
+
+@pytest.mark.parametrize("session_name", ["notes", "session-1", "my-notes-2024"])
+def test_message_ids_are_unique(session_name):
+    session_manager = SessionManager()
+    session_manager.add_session(session_name, CHAT_APP)
+    for index in range(12):
+        session_manager.add_user_message(f"question {index}")
+        _, timestamp, message_id = session_manager.generate_empty_assistant_message()
+        session_manager.add_assistant_message(
+            session_name, f"answer {index}", timestamp, message_id
+        )
+
+    ids = [
+        message["id"] for message in session_manager.get_session_messages(session_name)
+    ]
+    assert ids == [f"{session_name}-{index}" for index in range(25)]
@@ -0,0 +1,236 @@
+import json
+
+from session_storage import JournalSessionStorage, SqliteSessionStorage
+from util import save_data
+
+
+def make_session(session_id):
+    return {
+        "id": session_id,
+        "app": "chat",
+        "scroll_pos": 0,
+        "preview": "",
+        "messages": [],
+    }
+
+
+def make_message(session_id, index):
+    return {
+        "role": "user",
+        "content": f"message {index}",
+        "timestamp": "24.01.01 00:00",
+        "id": f"{session_id}-{index}",
+    }
+
+
+def write_journal(save_dir, records, tail=""):
+    with open(save_dir / "session.journal", "w") as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+        file.write(tail)
+
+
+def create_storage(save_dir):
+    return JournalSessionStorage(str(save_dir), None)
+
+
+def get_contents(snapshot, session_id):
+    session = next(s for s in snapshot["sessions"] if s["id"] == session_id)
+    return [message["content"] for message in session["messages"]]
+
+
+def test_replays_new_records(app_dir):
+    write_journal(
+        app_dir,
+        [
+            {"seq": 1, "op": "add_session", "session": make_session("s")},
+            {
+                "seq": 2,
+                "op": "add_message",
+                "session": "s",
+                "message": make_message("s", 0),
+            },
+            {"seq": 3, "op": "set_current_session", "session": "s"},
+        ],
+    )
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == ["message 0"]
+    assert snapshot["last_session"] == "s"
+
+    # the replayed records were compacted into the snapshot
+    assert create_storage(app_dir).load()["sessions"] == snapshot["sessions"]
+    assert (app_dir / "session.journal").read_text() == ""
+
+
+def test_skips_compacted_records(app_dir):
+    session = make_session("s")
+    session["messages"] = [make_message("s", 0)]
+    save_data(
+        {"last_session": "s", "sessions": [session], "journal_seq": 2},
+        str(app_dir / "session.json"),
+    )
+    write_journal(
+        app_dir,
+        [
+            {"seq": 1, "op": "add_session", "session": make_session("s")},
+            {
+                "seq": 2,
+                "op": "add_message",
+                "session": "s",
+                "message": make_message("s", 0),
+            },
+            {
+                "seq": 3,
+                "op": "add_message",
+                "session": "s",
+                "message": make_message("s", 1),
+            },
+        ],
+    )
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == ["message 0", "message 1"]
+
+
+def test_torn_tail_is_dropped(app_dir):
+    write_journal(
+        app_dir,
+        [{"seq": 1, "op": "add_session", "session": make_session("s")}],
+        tail='{"seq": 2, "op": "add_mes',
+    )
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == []
+
+
+def test_append_after_torn_only_record(app_dir):
+    write_journal(app_dir, [], tail='{"seq": 1, "op": "add_mes')
+    storage = create_storage(app_dir)
+    assert storage.load()["sessions"] == []
+
+    storage.add_session(make_session("s"))
+    for index in range(3):
+        storage.add_message("s", make_message("s", index))
+
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == ["message 0", "message 1", "message 2"]
+
+
+def test_append_after_torn_record_following_compacted_ones(app_dir):
+    session = make_session("s")
+    session["messages"] = [make_message("s", 0)]
+    save_data(
+        {"last_session": "s", "sessions": [session], "journal_seq": 2},
+        str(app_dir / "session.json"),
+    )
+    write_journal(
+        app_dir,
+        [
+            {"seq": 1, "op": "add_session", "session": make_session("s")},
+            {
+                "seq": 2,
+                "op": "add_message",
+                "session": "s",
+                "message": make_message("s", 0),
+            },
+        ],
+        tail='{"seq": 3, "op": "add_mes',
+    )
+    storage = create_storage(app_dir)
+    assert get_contents(storage.load(), "s") == ["message 0"]
+
+    storage.add_message("s", make_message("s", 1))
+    storage.add_message("s", make_message("s", 2))
+
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == ["message 0", "message 1", "message 2"]
+
+
+def test_append_after_record_without_newline(app_dir):
+    write_journal(
+        app_dir,
+        [],
+        tail=json.dumps({"seq": 1, "op": "add_session", "session": make_session("s")}),
+    )
+    storage = create_storage(app_dir)
+    assert get_contents(storage.load(), "s") == []
+
+    storage.add_message("s", make_message("s", 0))
+
+    snapshot = create_storage(app_dir).load()
+    assert get_contents(snapshot, "s") == ["message 0"]
+
+
+def test_sqlite_migrates_snapshot_and_journal(app_dir):
+    session = make_session("s")
+    session["messages"] = [make_message("s", 0)]
+    save_data(
+        {"last_session": "s", "sessions": [session]}, str(app_dir / "session.json")
+    )
+    write_journal(
+        app_dir,
+        [
+            {
+                "seq": 1,
+                "op": "add_message",
+                "session": "s",
+                "message": make_message("s", 1),
+            }
+        ],
+        tail='{"seq": 2, "op": "add_mes',
+    )
+    snapshot_before = (app_dir / "session.json").read_text()
+    journal_before = (app_dir / "session.journal").read_text()
+
+    storage = SqliteSessionStorage(str(app_dir))
+    assert [s["id"] for s in storage.load()["sessions"]] == ["s"]
+    assert storage.load()["last_session"] == "s"
+    assert [m["content"] for m in storage.load_messages("s")] == [
+        "message 0",
+        "message 1",
+    ]
+
+    # the migration only reads the old files
+    assert (app_dir / "session.json").read_text() == snapshot_before
+    assert (app_dir / "session.journal").read_text() == journal_before
+
+
+def test_sqlite_retries_failed_migration(app_dir, monkeypatch):
+    save_data(
+        {"last_session": "s", "sessions": [make_session("s")]},
+        str(app_dir / "session.json"),
+    )
+
+    def fail(self, session):
+        raise RuntimeError("interrupted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SqliteSessionStorage, "insert_session", fail)
+        try:
+            SqliteSessionStorage(str(app_dir))
+        except RuntimeError:
+            pass
+    assert (app_dir / "session.db").exists()
+
+    storage = SqliteSessionStorage(str(app_dir))
+    assert [s["id"] for s in storage.load()["sessions"]] == ["s"]
+
+
+def test_sqlite_migrates_once(app_dir):
+    save_data(
+        {"last_session": "s", "sessions": [make_session("s")]},
+        str(app_dir / "session.json"),
+    )
+    SqliteSessionStorage(str(app_dir)).add_session(make_session("t"))
+
+    storage = SqliteSessionStorage(str(app_dir))
+    assert [s["id"] for s in storage.load()["sessions"]] == ["s", "t"]
+
+
+def test_sqlite_skips_sessions_without_id(app_dir):
+    session = make_session("s")
+    del session["id"]
+    save_data(
+        {"last_session": None, "sessions": [session, make_session("t")]},
+        str(app_dir / "session.json"),
+    )
+    storage = SqliteSessionStorage(str(app_dir))
+    assert [s["id"] for s in storage.load()["sessions"]] == ["t"]
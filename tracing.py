@@ -0,0 +1,230 @@
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+
+from util import get_app_save_dir, get_setting
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+TRACE_FILE_NAME = "traces.jsonl"
+
+
+def get_trace(response_info):
+    """
+    Returns the trace of a response, or a trace that is never recorded if the
+    caller did not ask for one.
+    """
+    return (response_info or {}).get("trace") or Trace()
+
+
+class Trace:
+    """
+    The timed spans of one response: for example "queue", "setup", "embed",
+    "retrieve", "ttft", "generate" and "persist". Span offsets and durations
+    are in milliseconds since the request started.
+    """
+
+    def __init__(self, app_id=None, model=None, session_id=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.app_id = app_id
+        self.model = model
+        self.session_id = session_id
+        self.created = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.first_token = None
+        self.chunks = 0
+        self.cached = False
+        self.status = None
+        self.spans = []
+
+    def add_span(self, name, start, end):
+        self.spans.append(
+            {
+                "name": name,
+                "start_ms": round((start - self.start) * 1000, 2),
+                "duration_ms": round((end - start) * 1000, 2),
+            }
+        )
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter())
+
+    def add_chunk(self):
+        self.chunks += 1
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            self.add_span("ttft", self.start, self.first_token)
+
+    def finish_generation(self, status):
+        self.status = status
+        if self.first_token is not None:
+            self.add_span("generate", self.first_token, time.perf_counter())
+
+    def get_duration(self, name):
+        """
+        Returns the total duration of the spans with the name in seconds.
+        """
+        return (
+            sum(span["duration_ms"] for span in self.spans if span["name"] == name)
+            / 1000
+        )
+
+    def format_readout(self):
+        """
+        Returns a one-line summary for the header.
+        """
+        parts = [f"total {self.end - self.start:.2f}s"]
+        for name in ["queue", "setup", "embed", "retrieve", "ttft"]:
+            duration = self.get_duration(name)
+            if duration >= 0.01:
+                parts.append(f"{name} {duration:.2f}s")
+        generate = self.get_duration("generate")
+        if generate > 0:
+            parts.append(f"{self.chunks / generate:.0f} chunks/s")
+        return " | ".join(parts)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "app": self.app_id,
+            "model": self.model,
+            "session": self.session_id,
+            "created": self.created,
+            "status": self.status,
+            "cached": self.cached,
+            "chunks": self.chunks,
+            "total_ms": round((self.end - self.start) * 1000, 2),
+            "spans": self.spans,
+        }
+
+
+class Tracer:
+    """
+    Creates the traces of responses and appends finished ones to traces.jsonl
+    in the app save directory. The file is rotated once it reaches
+    tracing.max_bytes, keeping tracing.backup_count old files.
+
+    callback is called with every recorded trace, for example to show it in the
+    UI.
+    """
+
+    def __init__(self, path=None):
+        self.enabled = get_setting("tracing", "enabled", True)
+        self.path = path or os.path.join(
+            get_app_save_dir("ollama-rag-tui"), TRACE_FILE_NAME
+        )
+        self.max_bytes = get_setting("tracing", "max_bytes", DEFAULT_MAX_BYTES)
+        self.backup_count = get_setting("tracing", "backup_count", DEFAULT_BACKUP_COUNT)
+        self.handler = None
+        self.callback = None
+
+    def start(self, app_id, model, session_id):
+        return Trace(app_id, model, session_id)
+
+    def record(self, trace):
+        """
+        Finishes the trace and writes it to the trace file.
+        """
+        trace.end = time.perf_counter()
+        if self.enabled:
+            if self.handler is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.handler = RotatingFileHandler(
+                    self.path,
+                    maxBytes=self.max_bytes,
+                    backupCount=self.backup_count,
+                    delay=True,
+                )
+            self.handler.handle(
+                logging.makeLogRecord({"msg": json.dumps(trace.to_dict())})
+            )
+        if self.callback:
+            self.callback(trace)
+
+
+def load_traces(path):
+    """
+    Yields the traces of the trace file and its rotated backups, oldest first.
+    """
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    for file_path in [*reversed(backups), path]:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize_traces(traces):
+    """
+    Returns the p50 and p95 durations in milliseconds of the total and of every
+    span, per app and model.
+    """
+    groups = {}
+    for trace in traces:
+        group = groups.setdefault((trace["app"], trace["model"]), {"total": []})
+        group["total"].append(trace["total_ms"])
+        durations = {}
+        for span in trace["spans"]:
+            durations[span["name"]] = (
+                durations.get(span["name"], 0.0) + span["duration_ms"]
+            )
+        for name, duration in durations.items():
+            group.setdefault(name, []).append(duration)
+    return {
+        key: {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+            }
+            for name, values in group.items()
+        }
+        for key, group in groups.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prints p50/p95 latencies per app and model from the traces."
+    )
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=os.path.join(get_app_save_dir("ollama-rag-tui"), TRACE_FILE_NAME),
+    )
+    args = parser.parse_args()
+    for (app_id, model), spans in summarize_traces(load_traces(args.path)).items():
+        print(f"{app_id} ({model})")
+        for name, stats in spans.items():
+            print(
+                f"  {name:<10} n={stats['count']:<6} "
+                f"p50 {stats['p50']:>10.1f} ms  p95 {stats['p95']:>10.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -39,3 +39,53 @@ def generate_message_ids(session_name, count=1):
     for i in range(count):
         ids.append(f"{prefix}{i}")
     return ids
+
+
+def generate_session_preview(messages, limit=71):
+    """
+    Generates a preview string from the last messages of a chat session.
+    """
+    output = ""
+    for msg in messages[-4:]:
+        content = msg["content"][:limit] + (msg["content"][limit:] and "...")
+        output += f"{msg['role']}: {content}\n"
+    return output.strip()
+
+
+def load_settings(app_name):
+    settings_path = os.path.join(get_app_save_dir(app_name), "settings.json")
+    return load_data(settings_path) or {}
+
+
+def get_setting(section, key, default=None):
+    settings = load_settings("ollama-rag-tui")
+    return settings.get(section, {}).get(key, default)
+
+
+def get_file_mtime(file_path):
+    if not os.path.exists(file_path):
+        return None
+    return os.path.getmtime(file_path)
+
+
+def get_directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.isfile(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+def save_data_atomic(data, file_path):
+    app_dir = os.path.dirname(file_path)
+    if not os.path.exists(app_dir):
+        os.makedirs(app_dir)
+
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
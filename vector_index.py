@@ -0,0 +1,79 @@
+from lancedb.index import IvfFlat, IvfHnswPq, IvfHnswSq, IvfPq, IvfSq
+from llama_index.vector_stores.lancedb.base import TableNotFoundError
+
+DEFAULT_MIN_ROWS = 100000
+DEFAULT_REBUILD_RATIO = 0.2
+DEFAULT_INDEX_TYPE = "IVF_PQ"
+DEFAULT_NPROBES = 20
+VECTOR_COLUMN = "vector"
+INDEX_TYPES = {
+    "IVF_FLAT": IvfFlat,
+    "IVF_SQ": IvfSq,
+    "IVF_PQ": IvfPq,
+    "IVF_HNSW_SQ": IvfHnswSq,
+    "IVF_HNSW_PQ": IvfHnswPq,
+}
+PQ_INDEX_TYPES = ["IVF_PQ", "IVF_HNSW_PQ"]
+
+
+def get_table(vector_store):
+    """
+    Returns the LanceDB table of a LanceDBVectorStore, or None if no chunk was
+    added yet. The store only exposes the table through a property that raises
+    in that case.
+    """
+    try:
+        return vector_store.table
+    except TableNotFoundError:
+        return None
+
+
+def get_vector_index(table):
+    """
+    Returns the approximate-nearest-neighbour index of the table, or None.
+    """
+    return next(
+        (
+            index
+            for index in table.list_indices()
+            if VECTOR_COLUMN in index.columns and index.index_type != "FTS"
+        ),
+        None,
+    )
+
+
+def needs_vector_index(table, config):
+    """
+    Checks if the table is large enough for an ANN index and either has none
+    yet or too many rows were added since it was built. Rows added after the
+    index was built are still found, but by a flat scan.
+    """
+    rows = table.count_rows()
+    if rows < config.get("min_rows", DEFAULT_MIN_ROWS):
+        return False
+    index = get_vector_index(table)
+    if index is None:
+        return True
+    rebuild_ratio = config.get("rebuild_ratio", DEFAULT_REBUILD_RATIO)
+    return index.num_unindexed_rows > rows * rebuild_ratio
+
+
+def create_vector_index(table, config):
+    """
+    Builds (or replaces) the ANN index of the table. Partitions and sub-vectors
+    are chosen by LanceDB unless configured.
+    """
+    index_type = config.get("index_type", DEFAULT_INDEX_TYPE)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown vector index type {index_type!r}, "
+            f"expected one of {', '.join(INDEX_TYPES)}"
+        )
+    options = {"num_partitions": config.get("num_partitions")}
+    if index_type in PQ_INDEX_TYPES:
+        options["num_sub_vectors"] = config.get("num_sub_vectors")
+    table.create_index(
+        VECTOR_COLUMN,
+        config=INDEX_TYPES[index_type](distance_type="l2", **options),
+        replace=True,
+    )